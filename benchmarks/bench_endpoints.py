@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Measure throughput, latency, and memory of each Machina method against a local FakeMachina server. """
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+
+from management_api_tools import Machina
+from management_api_tools.testing import FakeMachina
+
+INSTANCE_ID, IDENTITY, SECRET = 'BENCH', 'bench-identity', 'YmVuY2gtc2VjcmV0'
+POLICY = {'status': 'Published', 'enabled': True, 'description': 'Benchmark policy.',
+          'ruleCombiningAlgId': 'deny-overrides', 'rules': [{'ruleId': 'b3nc', 'effect': 'Permit'}]}
+
+
+def operations(machina: Machina, server: FakeMachina) -> Dict[str, Callable[[int], object]]:
+    """ One callable per Machina method, taking the index of the call. """
+    identifiers = list(server.policies[INSTANCE_ID])
+
+    def document(index: int) -> str:
+        return json.dumps(dict(POLICY, policyId=f'bench-{index}'))
+
+    return {
+        'list_policies': lambda index: machina.list_policies(limit=100),
+        'fetch_policy': lambda index: machina.fetch_policy(identifiers[index % len(identifiers)]),
+        'create_policy': lambda index: machina.create_policy(document(index)),
+        'update_policy': lambda index: machina.update_policy(identifiers[index % len(identifiers)], document(index)),
+        'create_update_multiple_policies': lambda index: machina.create_update_multiple_policies(
+            json.dumps([json.loads(document(index))]), merge=True),
+        'delete_policy': lambda index: machina.delete_policy(f'missing-{index}'),
+        'metrics': lambda index: machina.metrics(metric='total-users', start='20210101-00:00', end='20210102-00:00',
+                                                 bucket='1h'),
+    }
+
+
+def run(operation: Callable[[int], object], calls: int, concurrency: int) -> List[float]:
+    """ Make `calls` calls on `concurrency` threads, returning each call's latency in seconds. """
+    def timed(index: int) -> float:
+        started = time.perf_counter()
+        operation(index)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, range(calls)))
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=500, help='Calls per method and concurrency level.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Thread counts to measure.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Server latency in seconds per request.')
+    parser.add_argument('--policies', type=int, default=200, help='Policies seeded on the server.')
+    parser.add_argument('--methods', nargs='+', help='Only measure these methods.')
+    arguments = parser.parse_args()
+
+    with FakeMachina(latency=arguments.latency, hmac_credentials={IDENTITY: SECRET}) as server:
+        server.add_policies(instance_id=INSTANCE_ID, count=arguments.policies)
+        machina = Machina(instance_id=INSTANCE_ID, api_url=server.api_url)
+        machina.hmac_authentication(identity=IDENTITY, secret=SECRET)
+        machina.configure_connection_pool(pool_maxsize=max(arguments.concurrency))
+
+        print(f'{"method":<34}{"threads":>8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"peak KiB":>10}')
+        for name, operation in operations(machina=machina, server=server).items():
+            if arguments.methods and name not in arguments.methods:
+                continue
+            for concurrency in arguments.concurrency:
+                started = time.perf_counter()
+                latencies = run(operation, calls=arguments.calls, concurrency=concurrency)
+                elapsed = time.perf_counter() - started
+
+                # Memory is traced in a separate, shorter pass so tracing does not skew the timings.
+                tracemalloc.start()
+                run(operation, calls=max(1, arguments.calls // 10), concurrency=concurrency)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                print(f'{name:<34}{concurrency:>8}{arguments.calls / elapsed:>10,.0f}'
+                      f'{statistics.median(latencies) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}'
+                      f'{peak / 1024:>10,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Compare streamed decoding of a policy list with json.loads of the whole body, for many items and for one large. """
+
+from typing import Callable, Iterator
+import argparse
+import json
+import time
+
+from management_api_tools.utils.streaming import iter_json_array
+
+
+def policy(index: int) -> dict:
+    return {'id': f'{index:024x}', 'policyId': f'bench-{index}', 'status': 'Published', 'enabled': True,
+            'description': 'Benchmark policy.', 'ruleCombiningAlgId': 'deny-overrides',
+            'rules': [{'ruleId': f'r{rule}', 'effect': 'Permit', 'conditions': {'attributes': ['classification']}}
+                      for rule in range(2)]}
+
+
+def chunks(body: bytes, chunk_size: int) -> Iterator[bytes]:
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+def best_of(function: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--policies', type=int, default=20000, help='Policies in the list.')
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024, help='Bytes per chunk, as stream_items reads.')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the best is reported.')
+    arguments = parser.parse_args()
+
+    policies = [policy(index) for index in range(arguments.policies)]
+    bodies = {
+        'many items': json.dumps({'totalResults': len(policies), 'Resources': policies}).encode(),
+        # One item holding every policy, so a single item spans many chunks.
+        'one large item': json.dumps({'Resources': [{'rules': policies}]}).encode(),
+    }
+
+    print(f'{"body":<16}{"MB":>8}{"json.loads s":>14}{"stream s":>10}{"fields s":>10}{"stream/loads":>14}')
+    for name, body in bodies.items():
+        loads = best_of(lambda: json.loads(body)['Resources'], repeat=arguments.repeat)
+        stream = best_of(lambda: list(iter_json_array(chunks(body, arguments.chunk_size), key='Resources')),
+                         repeat=arguments.repeat)
+        fields = best_of(lambda: list(iter_json_array(chunks(body, arguments.chunk_size), key='Resources',
+                                                      fields=('id', 'policyId'))), repeat=arguments.repeat)
+        print(f'{name:<16}{len(body) / 1e6:>8.1f}{loads:>14.3f}{stream:>10.3f}{fields:>10.3f}{stream / loads:>13.2f}x')
+
+
+if __name__ == '__main__':
+    main()
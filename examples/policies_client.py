@@ -3,19 +3,11 @@
 
 """ Sample usage of the Data Policy API. """
 
-from dataclasses import dataclass
 from pathlib import Path
 import json
 
 from unofficial_sdk import Machina
-
-
-@dataclass
-class Policy:
-    """ Data container for fetched policies. """
-    id: str
-    policyId: str
-    description: str
+from unofficial_sdk.models import Policy
 
 
 #######################
@@ -42,12 +34,11 @@ def fetch_policy_example():
     """ Fetch policy example. """
     api = Machina(instance_id=INSTANCE_ID)
     api.bearer_authentication(token=SECRET_TOKEN)
-    policies_list = api.list_policies().json()['Resources']
-    policies_generator = (Policy(id=policy['id'], policyId=policy['policyId'], description=policy['description'])
-                          for policy in policies_list)
+    policies_generator = api.list_policies(stream=True, models=True)
 
-    for policy in policies_generator:
-        yield api.fetch_policy(policy_identifier=policy.id)
+    # Fetch concurrently; each result carries the policy identifier, and a response or an error.
+    for result in api.fetch_policies(policy_identifiers=(policy.id for policy in policies_generator), max_workers=16):
+        yield result.response if result.ok else result.error or result.response
 
 
 def create_policy_example():
@@ -95,7 +86,7 @@ if __name__ == '__main__':
     # print(list_policies_pretty)
 
     # fetch_policy = fetch_policy_example()
-    # fetch_policy_json = [policy.json() for policy in fetch_policy]
+    # fetch_policy_json = [policy.json() for policy in fetch_policy if hasattr(policy, 'json')]
     # fetch_policy_pretty = json.dumps(obj=fetch_policy_json, indent=4)
     # print(fetch_policy_pretty)
 
@@ -1,8 +1,31 @@
 __copyright__ = "\u00A9 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use)."
 
-from management_api_tools.utils.auth import MachinaLogin
-from management_api_tools.api import Metrics, DataPolicies
+from typing import TYPE_CHECKING, Any, List
+import importlib
 
+if TYPE_CHECKING:  # pragma: no cover
+    from management_api_tools.api import DataPolicies, Metrics
+    from management_api_tools.client import Machina
+    from management_api_tools.utils.auth import MachinaLogin
 
-class Machina(Metrics, DataPolicies):
-    pass
+# The public classes are imported on first access (PEP 562), so `import management_api_tools.cli` does not pay for
+# requests and every API mixin before it is needed.
+_EXPORTS = {
+    'MachinaLogin': 'management_api_tools.utils.auth',
+    'Metrics': 'management_api_tools.api',
+    'DataPolicies': 'management_api_tools.api',
+    'Machina': 'management_api_tools.client',
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
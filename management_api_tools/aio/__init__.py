@@ -0,0 +1,11 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Asyncio client for the Machina Management API's. Requires the `async` extra (aiohttp). """
+
+from management_api_tools.aio.auth import AsyncMachinaLogin
+from management_api_tools.aio.metrics import AsyncMetrics
+from management_api_tools.aio.policies import AsyncDataPolicies
+
+
+class AsyncMachina(AsyncMetrics, AsyncDataPolicies):
+    pass
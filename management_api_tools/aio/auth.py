@@ -0,0 +1,117 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Machina Authentication for the asyncio client. """
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import asyncio
+import functools
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError as error:  # pragma: no cover
+    raise ImportError('The asyncio client requires aiohttp: '
+                      'python -m pip install "management_api_tools[async]"') from error
+
+from management_api_tools.utils.auth import API_URL, DEFAULT_CONTENT_TYPE, HmacAuth
+from management_api_tools.utils.coalesce import AsyncSingleFlight, request_key
+
+
+@dataclass
+class AsyncMachinaLogin:
+    """
+    Authenticate to the Machina API from asyncio code.
+    Requests share one pooled aiohttp session, capped at `max_connections` open connections and `concurrency`
+    in-flight requests. Use as an async context manager, or await `close()` when finished.
+    """
+    instance_id: str
+    api_url: str = field(default=API_URL, repr=False)
+    max_connections: int = 100
+    concurrency: int = 10
+    instance_url: str = field(init=False, default=None)
+    api_session: Optional[aiohttp.ClientSession] = field(init=False, repr=False, default=None)
+    _headers: Dict[str, str] = field(init=False, repr=False, default_factory=dict)
+    _basic_auth: Optional[aiohttp.BasicAuth] = field(init=False, repr=False, default=None)
+    _hmac_auth: Optional[HmacAuth] = field(init=False, repr=False, default=None)
+    single_flight: Optional[AsyncSingleFlight] = field(init=False, repr=False, default=None)
+    _semaphore: Optional[asyncio.Semaphore] = field(init=False, repr=False, default=None)
+
+    def __post_init__(self) -> None:
+        self.instance_url = f'{self.api_url}/{self.instance_id}'
+
+    async def __aenter__(self) -> 'AsyncMachinaLogin':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """ Close the pooled connections. """
+        if self.api_session is not None:
+            await self.api_session.close()
+            self.api_session = None
+
+    def basic_authentication(self, username: str, password: str) -> None:
+        """ Use Basic Authentication to authenticate with the Machina API. """
+        self._clear_authentication()
+        self._basic_auth = aiohttp.BasicAuth(login=username, password=password)
+
+    def bearer_authentication(self, token: str) -> None:
+        """ Use Bearer Authentication to authenticate with the Machina API. """
+        self._clear_authentication()
+        self._headers.update({'Authorization': f'Bearer {token}'})
+
+    def hmac_authentication(self, identity: str, secret: str) -> None:
+        """ Use HMAC Authentication to authenticate with the Machina API. """
+        self._clear_authentication()
+        self._hmac_auth = HmacAuth(identity=identity, secret=secret)
+
+    def _clear_authentication(self) -> None:
+        """ Forget the previous method, since aiohttp rejects `auth=` together with an Authorization header. """
+        self._basic_auth, self._hmac_auth = None, None
+        self._headers.pop('Authorization', None)
+
+    def enable_coalescing(self) -> AsyncSingleFlight:
+        """
+        Share one request, and its response, among identical GETs in flight at the same time.
+        Returns the single-flight group, which counts shared calls through `stats()`.
+        """
+        self.single_flight = AsyncSingleFlight()
+        return self.single_flight
+
+    def _client(self) -> aiohttp.ClientSession:
+        """ Lazily create the session inside the running event loop. """
+        if self.api_session is None or self.api_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self.api_session = aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self.api_session
+
+    async def _request(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                       data: Optional[str] = None) -> aiohttp.ClientResponse:
+        """ Send a request and read the body, so the response is usable after the connection is released. """
+        if method == 'GET' and self.single_flight is not None:
+            send = functools.partial(self._send, method=method, url=url, params=params, data=data)
+            return await self.single_flight.do(key=request_key(method=method, url=url, params=params), function=send)
+        return await self._send(method=method, url=url, params=params, data=data)
+
+    async def _send(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                    data: Optional[str] = None) -> aiohttp.ClientResponse:
+        session = self._client()
+        headers = dict(self._headers)
+        # aiohttp would label a str body as text/plain, requests sends it unlabelled, Machina expects JSON.
+        if data is not None or self._hmac_auth is not None:
+            headers.setdefault('Content-Type', DEFAULT_CONTENT_TYPE)
+        # Mirror requests: drop None values and send everything else as its str() form (merge=False -> 'False').
+        query = {key: str(value) for key, value in (params or {}).items() if value is not None}
+
+        async with self._semaphore:
+            if self._hmac_auth is not None:
+                path_url = URL(url).raw_path
+                headers.update(self._hmac_auth.sign(method=method, path_url=path_url, headers=headers))
+
+            async with session.request(method=method, url=url, params=query, data=data, headers=headers,
+                                       auth=self._basic_auth) as response:
+                await response.read()
+        return response
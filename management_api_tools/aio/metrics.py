@@ -0,0 +1,27 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Asyncio SDK for the Machina Metrics API. """
+
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+from management_api_tools.aio.auth import AsyncMachinaLogin
+
+
+@dataclass
+class AsyncMetrics(AsyncMachinaLogin):
+    """
+    Asyncio counterpart of `Metrics`. Each method returns an `aiohttp.ClientResponse` whose body is already read.
+    Developer Documentation: https://dev.ionic.com/api/metrics/metrics-api
+    """
+    async def metrics(self, **kwargs: Any) -> aiohttp.ClientResponse:
+        """
+        The metrics API allows developers to retrieve metrics recorded for various request types.
+        Developer Documentation: https://dev.ionic.com/api/metrics/metrics-api
+        """
+        api_endpoint_url = f'{self.instance_url}/metrics'
+
+        response = await self._request('GET', url=api_endpoint_url, params=kwargs)
+        return response
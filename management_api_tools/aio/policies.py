@@ -0,0 +1,77 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Asyncio SDK for the Machina Data Policies API. """
+
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+from management_api_tools.aio.auth import AsyncMachinaLogin
+
+
+@dataclass
+class AsyncDataPolicies(AsyncMachinaLogin):
+    """
+    Asyncio counterpart of `DataPolicies`. Each method returns an `aiohttp.ClientResponse` whose body is already read.
+    Developer Documentation: https://dev.ionic.com/api/policies
+    """
+    async def list_policies(self, **kwargs: Any) -> aiohttp.ClientResponse:
+        """
+        Returns a list of information about data policies that match the specified query parameters.
+        Developer Documentation: https://dev.ionic.com/api/policies/list-policies
+        """
+        api_endpoint_url = f'{self.instance_url}/policies'
+
+        response = await self._request('GET', url=api_endpoint_url, params=kwargs)
+        return response
+
+    async def fetch_policy(self, policy_identifier: str) -> aiohttp.ClientResponse:
+        """
+        Returns the specified data policy.
+        Developer Documentation: https://dev.ionic.com/api/policies/fetch-policy
+        """
+        api_endpoint_url = f'{self.instance_url}/policies/{policy_identifier}'
+
+        response = await self._request('GET', url=api_endpoint_url)
+        return response
+
+    async def create_policy(self, policy_document: str) -> aiohttp.ClientResponse:
+        """
+        Creates a new data policy.
+        Developer Documentation: https://dev.ionic.com/api/policies/create-policy
+        """
+        api_endpoint_url = f'{self.instance_url}/policies/'
+
+        response = await self._request('POST', url=api_endpoint_url, data=policy_document)
+        return response
+
+    async def update_policy(self, policy_identifier: str, policy_document: str) -> aiohttp.ClientResponse:
+        """
+        Update an existing data policy.
+        Developer Documentation: https://dev.ionic.com/api/policies/update-policy
+        """
+        api_endpoint_url = f'{self.instance_url}/policies/{policy_identifier}'
+
+        response = await self._request('PUT', url=api_endpoint_url, data=policy_document)
+        return response
+
+    async def create_update_multiple_policies(self, policy_document: str, merge=False) -> aiohttp.ClientResponse:
+        """
+        Creates or updates one or more data policies.
+        Developer Documentation: https://dev.ionic.com/api/policies/create-or-update-multiple-policies
+        """
+        api_endpoint_url = f'{self.instance_url}/policies'
+
+        response = await self._request('POST', url=api_endpoint_url, data=policy_document, params={'merge': merge})
+        return response
+
+    async def delete_policy(self, policy_identifier: str) -> aiohttp.ClientResponse:
+        """
+        Deletes the specified data policy.
+        Developer Documentation: https://dev.ionic.com/api/policies/delete-policy
+        """
+        api_endpoint_url = f'{self.instance_url}/policies/{policy_identifier}'
+
+        response = await self._request('DELETE', url=api_endpoint_url)
+        return response
@@ -2,12 +2,21 @@
 
 """ Python SDK for the Machina Metrics API. """
 
-from dataclasses import dataclass
-from typing import Any
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+import json
+import time
 
 import requests
 
 from management_api_tools import MachinaLogin
+from management_api_tools.models import MetricPoint
+from management_api_tools.utils.buckets import (POINTS, TIMESTAMP, TimeLike, format_time, parse_time, split_range,
+                                                stitch_points, to_epoch)
+from management_api_tools.utils.concurrency import map_concurrently
+from management_api_tools.utils.scheduler import RequestScheduler
+from management_api_tools.utils.streaming import stream_items
 
 
 @dataclass
@@ -18,14 +27,142 @@ class Metrics(MachinaLogin):
     size period.
     Developer Documentation: https://dev.ionic.com/api/metrics/metrics-api
     """
-    def metrics(self, **kwargs: Any) -> requests.Response:
+    def metrics(self, stream: bool = False, fields: Optional[Sequence[str]] = None, models: bool = False,
+                **kwargs: Any) -> Union[requests.Response, Iterator[Union[dict, MetricPoint]]]:
         """
         The metrics API allows developers to retrieve metrics recorded for various request types.
         Metrics are available as a series of points over time, with each metric point describing activity within a fixed
         size period.
+        With `stream=True`, returns an iterator over the points instead, decoded as the body arrives, keeping only the
+        keys in `fields` if given, or as compact MetricPoint models if `models` is True.
+        Raises requests.HTTPError if the metrics cannot be fetched.
         Developer Documentation: https://dev.ionic.com/api/metrics/metrics-api
         """
         api_endpoint_url = f'{self.instance_url}/metrics'
 
-        response = self.api_session.get(url=api_endpoint_url, params=kwargs)
+        response = self.api_session.get(url=api_endpoint_url, params=kwargs, stream=stream)
+        if stream:
+            decode = MetricPoint.from_json if models else json.loads
+            return stream_items(response, key=POINTS, fields=fields, decode=decode)
         return response
+
+    def metrics_range(self, metric: str, start: TimeLike, end: TimeLike, bucket: str, chunk: Union[int, str] = 1000,
+                      max_workers: int = 4, retries: int = 2, **kwargs: Any) -> dict:
+        """
+        Retrieve a long metrics window as several bucket-aligned chunks fetched concurrently.
+        `chunk` is a number of buckets per request, or a duration such as '7d'. A chunk that fails with a connection
+        error, a timeout, 429, or 5xx is retried on its own up to `retries` times, by the request scheduler's policy:
+        honouring Retry-After, else after a jittered backoff. If `enable_scheduler` was called, its retries apply
+        instead. Then the error, or requests.HTTPError, is raised. Returns the metrics response shape, with the points
+        of every chunk stitched into one ordered series without duplicate buckets.
+        """
+        end = parse_time(end)
+        windows = split_range(start=start, end=end, bucket=bucket, chunk=chunk)
+        last_window = windows[-1] if windows else None
+        policy = RequestScheduler(retries=retries if self.scheduler is None else 0)
+
+        def fetch_window(window: tuple) -> List[dict]:
+            window_start, window_end = window
+            attempt = 0
+            while True:
+                response, error = None, None
+                try:
+                    response = self.metrics(metric=metric, start=format_time(window_start),
+                                            end=format_time(window_end), bucket=bucket, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as request_error:
+                    error = request_error
+                status_code = response.status_code if response is not None else None
+                if (response is not None and response.ok) or not policy.should_retry(
+                        method='GET', status_code=status_code, attempt=attempt):
+                    break
+                time.sleep(policy.delay(attempt=attempt, response=response))
+                attempt += 1
+            if error is not None:
+                raise error
+            response.raise_for_status()
+
+            # Keep each bucket in exactly one window; only the final window includes its end.
+            points = []
+            for point in response.json().get(POINTS, []):
+                timestamp = parse_time(point[TIMESTAMP])
+                if window_start <= timestamp < window_end or (window is last_window and timestamp == window_end):
+                    points.append(point)
+            return points
+
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        results = list(map_concurrently(fetch_window, windows, max_workers=max_workers, ordered=True))
+        for result in results:
+            if result.error is not None:
+                raise result.error
+
+        return {'metric': metric, 'bucket': bucket, 'start': format_time(windows[0][0]) if windows else None,
+                'end': format_time(end), POINTS: stitch_points(result.response for result in results)}
+
+    def metric_series(self, metric: str, start: TimeLike, end: TimeLike, bucket: str, **kwargs: Any):
+        """
+        Retrieve a metric as a columnar `management_api_tools.series.MetricSeries`. Requires the `series` extra.
+        Keyword arguments are passed to `metrics_range`, which splits long windows into concurrent chunks.
+        """
+        from management_api_tools.series import MetricSeries
+
+        body = self.metrics_range(metric=metric, start=start, end=end, bucket=bucket, **kwargs)
+        return MetricSeries.from_response(body=body)
+
+    def cached_metric_series(self, metric: str, start: TimeLike, end: TimeLike, bucket: str, store, **kwargs: Any):
+        """
+        Retrieve a metric through a `management_api_tools.store.MetricStore`, requesting only the buckets it does not
+        already hold. Buckets near now are treated as mutable and re-fetched. Requires the `series` extra.
+        Keyword arguments are passed to `metrics_range`.
+        """
+        from management_api_tools.series import MetricSeries
+
+        end = parse_time(end)
+        with store.lock(instance_id=self.instance_id, metric=metric, bucket=bucket):
+            for gap_start, gap_end in store.missing(instance_id=self.instance_id, metric=metric, bucket=bucket,
+                                                    start=start, end=end):
+                body = self.metrics_range(metric=metric, start=gap_start, end=gap_end, bucket=bucket, **kwargs)
+                series = MetricSeries.from_response(body=body, metric=metric, bucket=bucket)
+                store.write(series=series, instance_id=self.instance_id, start=gap_start, end=gap_end)
+
+        return store.read(instance_id=self.instance_id, metric=metric, bucket=bucket, start=start, end=end)
+
+    def query_many(self, queries: Iterable[Union[str, Mapping[str, Any]]], start: Optional[TimeLike] = None,
+                   end: TimeLike = 'now', bucket: Optional[str] = None, max_workers: int = 8,
+                   fill: float = float('nan'), **kwargs: Any):
+        """
+        Retrieve many metrics as one `management_api_tools.series.MetricTable`, aligned on bucket timestamps.
+        Each query is a metric name, which uses `start`, `end`, and `bucket`, or a mapping with `metric` and any of
+        `start`, `end`, `bucket`, and `name`, the column name (default: the metric). Identical queries are requested
+        once, with 'now' resolved once for all of them, and distinct queries are fetched concurrently on up to
+        `max_workers` threads. Keyword arguments are passed to `metrics_range`, which raises requests.HTTPError for a
+        query that still fails after its retries. Requires the `series` extra.
+        """
+        from management_api_tools.series import MetricSeries, align
+
+        now = datetime.now(timezone.utc)
+        columns: Dict[str, Tuple[str, int, int, str]] = {}
+        for query in queries:
+            query = dict({'start': start, 'end': end, 'bucket': bucket},
+                         **({'metric': query} if isinstance(query, str) else query))
+            name = query.pop('name', query['metric'])
+            if query['start'] is None or query['bucket'] is None:
+                raise ValueError(f'Query {name!r} needs a start and a bucket')
+            window = [to_epoch(now if query[edge] == 'now' else query[edge]) for edge in ('start', 'end')]
+            key = (query['metric'], window[0], window[1], query['bucket'])
+            if columns.setdefault(name, key) != key:
+                raise ValueError(f'Column {name!r} is named by two different queries; give them distinct names')
+
+        def fetch(key: Tuple[str, int, int, str]) -> MetricSeries:
+            metric, query_start, query_end, query_bucket = key
+            body = self.metrics_range(metric=metric, start=query_start, end=query_end, bucket=query_bucket,
+                                      max_workers=1, **kwargs)
+            return MetricSeries.from_response(body=body, metric=metric, bucket=query_bucket)
+
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        series = {}
+        for result in map_concurrently(fetch, dict.fromkeys(columns.values()), max_workers=max_workers):
+            if result.error is not None:
+                raise result.error
+            series[result.item] = result.response
+
+        return align((replace(series[key], metric=name) for name, key in columns.items()), fill=fill)
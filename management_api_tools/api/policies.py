@@ -2,12 +2,24 @@
 
 """ Python SDK for the Machina Data Policies API. """
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Union
+import json
 
 import requests
 
 from management_api_tools import MachinaLogin
+from management_api_tools.models import Policy
+from management_api_tools.utils.backup import BackupSummary, backup_policies, read_backup
+from management_api_tools.utils.concurrency import BatchResult, map_concurrently
+from management_api_tools.utils.documents import load_policies, policy_hash
+from management_api_tools.utils.journal import OperationJournal, Progress, run_journaled
+from management_api_tools.utils.streaming import stream_items
+from management_api_tools.utils.upload import UploadSummary, batch_document, split_policies
+from management_api_tools.utils.watch import Page, PolicyWatcher
+from management_api_tools.utils.reconcile import CREATE, UPDATE, DELETE, PolicyOperation, PolicyPlan, plan_policies
 
 
 @dataclass
@@ -18,16 +30,87 @@ class DataPolicies(MachinaLogin):
     Administrators can perform list, fetch, create, update, and delete actions on policies using these API endpoints.
     Developer Documentation: https://dev.ionic.com/api/policies
     """
-    def list_policies(self, **kwargs: Any) -> requests.Response:
+    def list_policies(self, stream: bool = False, fields: Optional[Sequence[str]] = None, models: bool = False,
+                      **kwargs: Any) -> Union[requests.Response, Iterator[Union[dict, Policy]]]:
         """
         Returns a list of information about data policies that match the specified query parameters.
+        With `stream=True`, returns an iterator over the policies in `Resources` instead, decoded as the body arrives,
+        keeping only the keys in `fields` if given, or as compact Policy models if `models` is True.
+        Raises requests.HTTPError if the list cannot be fetched.
         Developer Documentation: https://dev.ionic.com/api/policies/list-policies
         """
         api_endpoint_url = f'{self.instance_url}/policies'
 
-        response = self.api_session.get(url=api_endpoint_url, params=kwargs)
+        response = self.api_session.get(url=api_endpoint_url, params=kwargs, stream=stream)
+        if stream:
+            decode = Policy.from_json if models else json.loads
+            return stream_items(response, key='Resources', fields=fields, decode=decode)
         return response
 
+    def iter_policies(self, page_size: int = 100, **kwargs: Any) -> Iterator[dict]:
+        """
+        Yield data policies one at a time, walking the pages of `list_policies` with `skip` and `limit`.
+        The next page is requested in the background while the current page is consumed, and only one page is held in
+        memory at a time. Raises requests.HTTPError if a page cannot be listed, and ValueError if `limit` is given,
+        since each page's limit is `page_size`.
+        """
+        if 'limit' in kwargs:
+            raise ValueError('iter_policies sets the limit of each page; pass page_size instead of limit')
+        skip = kwargs.pop('skip', 0)
+
+        def list_page(page_skip: int) -> dict:
+            response = self.list_policies(**kwargs, skip=page_skip, limit=page_size)
+            response.raise_for_status()
+            return response.json()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page, previous_first = executor.submit(list_page, skip), None
+            while next_page is not None:
+                page = next_page.result()
+                resources = page.get('Resources', [])
+                if resources and resources[0] == previous_first:
+                    resources = []  # The server ignored `skip` and repeated the previous page.
+                skip += len(resources)
+                total_results = page.get('totalResults')
+
+                if not resources:
+                    next_page = None
+                elif total_results is None:
+                    next_page = executor.submit(list_page, skip) if len(resources) >= page_size else None
+                else:
+                    next_page = executor.submit(list_page, skip) if skip < total_results else None
+
+                del page
+                previous_first = resources[0] if resources else previous_first
+                yield from resources
+
+    def watch(self, min_interval: float = 1.0, max_interval: float = 60.0, page_size: int = 1000,
+              **kwargs: Any) -> PolicyWatcher:
+        """
+        Watch the data policies matching `kwargs` for changes, polling on a background thread.
+        The current state is fingerprinted now, raising requests.HTTPError if it cannot be listed; later polls send
+        If-None-Match per page, and publish added, modified, and removed policies to each `watcher.subscribe()`.
+        Polls are spaced between `min_interval` and `max_interval` seconds, according to how often changes are seen.
+        Call `watcher.stop()` when finished.
+        """
+        api_endpoint_url = f'{self.instance_url}/policies'
+
+        def fetch_page(skip: int, limit: int, etag: Optional[str]) -> Page:
+            headers = {'If-None-Match': etag} if etag else {}
+            response = self.api_session.get(url=api_endpoint_url, params=dict(kwargs, skip=skip, limit=limit),
+                                            headers=headers)
+            if response.status_code == 304:
+                return Page(not_modified=True, etag=etag, resources=[], total_results=None)
+            response.raise_for_status()
+            page = response.json()
+            return Page(not_modified=False, etag=response.headers.get('ETag'), resources=page.get('Resources', []),
+                        total_results=page.get('totalResults'))
+
+        watcher = PolicyWatcher(fetch_page=fetch_page, page_size=page_size, min_interval=min_interval,
+                                max_interval=max_interval)
+        watcher.poll()
+        return watcher.start()
+
     def fetch_policy(self, policy_identifier: str) -> requests.Response:
         """
         Returns the specified data policy.
@@ -38,6 +121,17 @@ class DataPolicies(MachinaLogin):
         response = self.api_session.get(url=api_endpoint_url)
         return response
 
+    def fetch_policies(self, policy_identifiers: Iterable[str], max_workers: int = 8,
+                       ordered: bool = False) -> Iterator[BatchResult]:
+        """
+        Fetch many data policies concurrently, yielding a BatchResult per policy identifier.
+        Results are yielded as they finish, or in input order if `ordered` is True. A failed fetch is reported on its
+        BatchResult without aborting the batch.
+        """
+        self.configure_connection_pool(pool_maxsize=max_workers)
+
+        yield from map_concurrently(self.fetch_policy, policy_identifiers, max_workers=max_workers, ordered=ordered)
+
     def create_policy(self, policy_document: str) -> requests.Response:
         """
         Creates a new data policy.
@@ -46,6 +140,8 @@ class DataPolicies(MachinaLogin):
         api_endpoint_url = f'{self.instance_url}/policies/'
 
         response = self.api_session.post(url=api_endpoint_url, data=policy_document)
+        if response.ok:
+            self.invalidate_cache(url=f'{self.instance_url}/policies')
         return response
 
     def update_policy(self, policy_identifier: str, policy_document: str) -> requests.Response:
@@ -56,6 +152,9 @@ class DataPolicies(MachinaLogin):
         api_endpoint_url = f'{self.instance_url}/policies/{policy_identifier}'
 
         response = self.api_session.put(url=api_endpoint_url, data=policy_document)
+        if response.ok:
+            self.invalidate_cache(url=f'{self.instance_url}/policies')
+            self.invalidate_cache(url=api_endpoint_url)
         return response
 
     def create_update_multiple_policies(self, policy_document: str, merge=False) -> requests.Response:
@@ -66,8 +165,49 @@ class DataPolicies(MachinaLogin):
         api_endpoint_url = f'{self.instance_url}/policies'
 
         response = self.api_session.post(url=api_endpoint_url, data=policy_document, params={'merge': merge})
+        if response.ok:
+            self.invalidate_cache(url=api_endpoint_url, descendants=True)
         return response
 
+    def upload_policies(self, policy_document: str, merge=True, batch_size: Optional[int] = 500,
+                        max_bytes: Optional[int] = None, max_workers: int = 4, dry_run: bool = False) -> UploadSummary:
+        """
+        Create or update many data policies through `create_update_multiple_policies`, in batches of at most
+        `batch_size` policies and `max_bytes` bytes, uploaded concurrently.
+        With merge='replace', deletions are computed once up front from the live policies, every batch is merged
+        additively, and the deletions are sent only after every batch succeeded. With `dry_run`, the document is split
+        and the batch sizes reported without any network calls.
+        """
+        desired = load_policies(policy_document=policy_document)
+        batches = split_policies(policies=desired, batch_size=batch_size, max_bytes=max_bytes)
+        summary = UploadSummary(batch_sizes=[len(batch) for batch in batches], dry_run=dry_run)
+        if dry_run:
+            return summary
+
+        replace = merge == 'replace'
+        deletions = []
+        if replace:
+            wanted = {policy['policyId'] for policy in desired}
+            deletions = [PolicyOperation(action=DELETE, policy_id=policy['policyId'], policy_identifier=policy['id'])
+                         for policy in self.iter_policies(page_size=1000) if policy['policyId'] not in wanted]
+
+        def upload(batch: List[str]) -> requests.Response:
+            return self.create_update_multiple_policies(policy_document=batch_document(batch),
+                                                        merge=True if replace else merge)
+
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        summary.batches = list(map_concurrently(upload, batches, max_workers=max_workers, ordered=True))
+        for result in summary.batches:
+            if result.ok and result.response.content:
+                try:
+                    summary.resources.extend(result.response.json().get('Resources', []))
+                except ValueError as error:  # A body that is not JSON, e.g. from a proxy, fails only its batch.
+                    result.error = error
+
+        if deletions and all(result.ok for result in summary.batches):
+            summary.deletions = list(map_concurrently(self.apply_operation, deletions, max_workers=max_workers))
+        return summary
+
     def delete_policy(self, policy_identifier: str) -> requests.Response:
         """
         Deletes the specified data policy.
@@ -76,4 +216,111 @@ class DataPolicies(MachinaLogin):
         api_endpoint_url = f'{self.instance_url}/policies/{policy_identifier}'
 
         response = self.api_session.delete(url=api_endpoint_url)
-        return response
\ No newline at end of file
+        if response.ok:
+            self.invalidate_cache(url=f'{self.instance_url}/policies')
+            self.invalidate_cache(url=api_endpoint_url)
+        return response
+
+    def plan_policies(self, policy_document: str, delete: bool = False, page_size: int = 1000) -> PolicyPlan:
+        """
+        Compare a policy document with the live data policies, and return the creates, updates, and deletes required.
+        Policies are matched by policyId and compared by content hash. Deletes are planned only if `delete` is True,
+        which mirrors merge='replace'.
+        """
+        desired = load_policies(policy_document=policy_document)
+        return plan_policies(desired=desired, live=self.iter_policies(page_size=page_size), delete=delete)
+
+    def apply_operation(self, operation: PolicyOperation) -> requests.Response:
+        """ Send a single planned operation to the API. """
+        if operation.action == CREATE:
+            return self.create_policy(policy_document=operation.policy_document)
+        if operation.action == UPDATE:
+            return self.update_policy(policy_identifier=operation.policy_identifier,
+                                      policy_document=operation.policy_document)
+        if operation.action == DELETE:
+            return self.delete_policy(policy_identifier=operation.policy_identifier)
+        raise ValueError(f'Unknown policy operation: {operation.action!r}')
+
+    def apply_plan(self, plan: PolicyPlan, max_workers: int = 8) -> List[BatchResult]:
+        """ Send the operations of a plan concurrently, returning a BatchResult per operation. """
+        self.configure_connection_pool(pool_maxsize=max_workers)
+
+        return list(map_concurrently(self.apply_operation, plan.operations, max_workers=max_workers))
+
+    def apply_journaled(self, operations: Iterable[PolicyOperation], journal: Union[str, Path], max_workers: int = 8,
+                        progress: Optional[Callable[[Progress], None]] = None) -> List[BatchResult]:
+        """
+        Apply operations concurrently, recording each and its outcome in an append-only journal file, which must not
+        already exist. If the job is interrupted, `resume_journaled(journal)` applies only the unfinished operations.
+        `progress` is called about once a second with a Progress giving counts, throughput, and ETA; `print` works.
+        Returns a BatchResult per operation.
+        """
+        with OperationJournal(path=journal) as operation_journal:
+            operation_journal.plan(operations=operations)
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        return run_journaled(apply=self.apply_operation, journal=OperationJournal(path=journal),
+                             max_workers=max_workers, progress=progress)
+
+    def resume_journaled(self, journal: Union[str, Path], max_workers: int = 8,
+                         progress: Optional[Callable[[Progress], None]] = None) -> List[BatchResult]:
+        """
+        Resume a job started by `apply_journaled`, applying only the operations without a finished outcome.
+        Operations in flight when the job stopped are applied again, except creates: if any is pending, the live
+        policyIds are listed once, and creates of policies that already exist are recorded as finished.
+        Returns a BatchResult per operation applied.
+        """
+        def existing() -> List[str]:
+            return [policy['policyId'] for policy in self.iter_policies(page_size=1000)]
+
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        return run_journaled(apply=self.apply_operation, journal=OperationJournal(path=journal),
+                             max_workers=max_workers, progress=progress, existing=existing)
+
+    def reconcile(self, policy_document: str, delete: bool = False, max_workers: int = 8) -> List[BatchResult]:
+        """
+        Converge the live data policies to a policy document, sending only the policies that differ.
+        When nothing differs, this costs a single list call and no writes.
+        """
+        plan = self.plan_policies(policy_document=policy_document, delete=delete)
+
+        return self.apply_plan(plan=plan, max_workers=max_workers)
+
+    def backup(self, directory: Union[str, Path], max_workers: int = 8, archive: Optional[Union[str, Path]] = None,
+               page_size: int = 1000) -> BackupSummary:
+        """
+        Save every data policy to its own JSON file in `directory`, writing only policies that changed since the last
+        backup according to the manifest of content hashes. Files of deleted policies are removed. If `archive` is
+        given, the backup is also packed into that single .tar.gz file.
+        """
+        return backup_policies(policies=self.iter_policies(page_size=page_size), directory=directory,
+                               max_workers=max_workers, archive=archive)
+
+    def restore(self, path: Union[str, Path], max_workers: int = 8, delete: bool = False,
+                page_size: int = 1000) -> List[BatchResult]:
+        """
+        Restore data policies from a backup directory or .tar.gz archive made by `backup`.
+        Live policies are indexed by policyId and content hash from a single walk of `list_policies`, and only
+        policies that differ from the backup are created or updated, concurrently. Backup files are read one at a
+        time. Live policies missing from the backup are deleted only if `delete` is True.
+        Returns a BatchResult per operation.
+        """
+        live = {}
+        for policy in self.iter_policies(page_size=page_size):
+            live.setdefault(policy['policyId'], (policy['id'], policy_hash(policy)))
+        restored = set()
+
+        def differs(policy_id: str, content_hash: str) -> bool:
+            restored.add(policy_id)
+            return live.get(policy_id, (None, None))[1] != content_hash
+
+        def operations() -> Iterator[PolicyOperation]:
+            for policy_id, policy_document in read_backup(path=path, wanted=differs):
+                policy_identifier = live.get(policy_id, (None, None))[0]
+                yield PolicyOperation(action=CREATE if policy_identifier is None else UPDATE, policy_id=policy_id,
+                                      policy_identifier=policy_identifier, policy_document=policy_document)
+            if delete:
+                yield from (PolicyOperation(action=DELETE, policy_id=policy_id, policy_identifier=policy_identifier)
+                            for policy_id, (policy_identifier, _) in live.items() if policy_id not in restored)
+
+        self.configure_connection_pool(pool_maxsize=max_workers)
+        return list(map_concurrently(self.apply_operation, operations(), max_workers=max_workers))
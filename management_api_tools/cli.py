@@ -0,0 +1,170 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+"""
+The `machina` command: read operations as NDJSON on stdin, run them concurrently, and write each result as NDJSON on
+stdout. Only the standard library is imported until the first operation runs, so `--help` returns immediately.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+import argparse
+import configparser
+import json
+import os
+import sys
+
+CONFIGURATION_FILE = '~/.machina/settings.ini'
+SETTINGS = ('instance_id', 'identity', 'secret', 'token', 'username', 'password')
+
+EPILOG = """
+operations, one JSON object per line:
+  {"op": "fetch", "id": "POLICY_ID"}
+  {"op": "create", "policy": {"policyId": "...", ...}}
+  {"op": "update", "id": "POLICY_ID", "policy": {"policyId": "...", ...}}
+  {"op": "delete", "id": "POLICY_ID"}
+  {"op": "metrics", "metric": "total-users", "start": "20210101-00:00", "end": "now", "bucket": "1h"}
+
+results, one JSON object per line, in completion order unless --ordered:
+  {"line": 1, "op": "fetch", "ok": true, "status": 200, "body": {...}}
+  {"line": 2, "op": "delete", "ok": false, "error": "ConnectionError: ..."}
+
+credentials are read from a --profile section of the configuration file (instance_id, and identity and secret,
+token, or username and password), and from MACHINA_INSTANCE_ID, MACHINA_IDENTITY, MACHINA_SECRET, MACHINA_TOKEN,
+MACHINA_USERNAME, and MACHINA_PASSWORD, which take precedence.
+exit status is 0 if every operation succeeded, and 1 otherwise.
+"""
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='machina', description='Run Machina API operations read as NDJSON on stdin.',
+                                     epilog=EPILOG, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instance-id', help='tenant instance id, overriding the profile and environment')
+    parser.add_argument('--api-url', help='API base URL (default: https://api.ionic.com/v2)')
+    parser.add_argument('--config', default=CONFIGURATION_FILE,
+                        help=f'configuration file (default: {CONFIGURATION_FILE})')
+    parser.add_argument('--profile', help='configuration file section holding credentials, e.g. hmac')
+    parser.add_argument('--max-workers', type=int, default=8, help='operations in flight at once (default: 8)')
+    parser.add_argument('--window', type=int,
+                        help='operations read ahead of the results written (default: 4 per worker)')
+    parser.add_argument('--ordered', action='store_true', help='write results in input order')
+    parser.add_argument('--retries', type=int, default=0, help='retry rate-limited and failed requests (default: 0)')
+    return parser.parse_args(argv)
+
+
+def load_settings(config: str, profile: Optional[str]) -> Dict[str, str]:
+    """ Read credentials from a configuration file section, overridden by MACHINA_* environment variables. """
+    settings = {}
+    if profile:
+        parser = configparser.ConfigParser()
+        parser.read(Path(config).expanduser())
+        if not parser.has_section(profile):
+            raise SystemExit(f'machina: no section [{profile}] in {config}')
+        settings.update((option, value) for option, value in parser.items(profile) if option in SETTINGS)
+    settings.update((option, os.environ[f'MACHINA_{option.upper()}']) for option in SETTINGS
+                    if f'MACHINA_{option.upper()}' in os.environ)
+    return settings
+
+
+def build_client(arguments: argparse.Namespace, settings: Dict[str, str]) -> Any:
+    """ Return an authenticated Machina, sized for the requested concurrency. """
+    from management_api_tools.client import Machina
+
+    instance_id = arguments.instance_id or settings.get('instance_id')
+    if not instance_id:
+        raise SystemExit('machina: an instance id is required (--instance-id, --profile, or MACHINA_INSTANCE_ID)')
+    api = Machina(instance_id=instance_id, **({'api_url': arguments.api_url} if arguments.api_url else {}))
+
+    if 'identity' in settings and 'secret' in settings:
+        api.hmac_authentication(identity=settings['identity'], secret=settings['secret'])
+    elif 'token' in settings:
+        api.bearer_authentication(token=settings['token'])
+    elif 'username' in settings and 'password' in settings:
+        api.basic_authentication(username=settings['username'], password=settings['password'])
+
+    api.configure_connection_pool(pool_maxsize=arguments.max_workers)
+    if arguments.retries:
+        api.enable_scheduler(retries=arguments.retries, initial_concurrency=min(8, arguments.max_workers),
+                             max_concurrency=arguments.max_workers)
+    return api
+
+
+def _document(policy: Any) -> str:
+    return policy if isinstance(policy, str) else json.dumps(policy)
+
+
+def run_operation(api: Any, operation: Any) -> Any:
+    """ Send one operation to the API and return the response. """
+    if isinstance(operation, Exception):
+        raise operation
+    if not isinstance(operation, dict):
+        raise ValueError('An operation must be a JSON object')
+
+    action = operation.get('op')
+    if action == 'fetch':
+        return api.fetch_policy(policy_identifier=operation['id'])
+    if action == 'create':
+        return api.create_policy(policy_document=_document(operation['policy']))
+    if action == 'update':
+        return api.update_policy(policy_identifier=operation['id'], policy_document=_document(operation['policy']))
+    if action == 'delete':
+        return api.delete_policy(policy_identifier=operation['id'])
+    if action == 'metrics':
+        return api.metrics(**{name: value for name, value in operation.items() if name != 'op'})
+    raise ValueError(f'Unknown operation: {action!r}')
+
+
+def read_operations(lines: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    """ Yield (line number, operation) for each non-blank line. A line that is not JSON yields its error instead. """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as error:
+            yield number, error
+
+
+def result_record(result: Any) -> Dict[str, Any]:
+    """ Describe the BatchResult of one operation as a JSON-ready dict. """
+    number, operation = result.item
+    record = {'line': number, 'op': operation.get('op') if isinstance(operation, dict) else None, 'ok': result.ok}
+    if result.error is not None:
+        record['error'] = f'{type(result.error).__name__}: {result.error}'
+        return record
+
+    response = result.response
+    record['status'] = response.status_code
+    try:
+        record['body'] = response.json() if response.content else None
+    except ValueError:
+        record['body'] = response.text
+    return record
+
+
+def main(argv: Optional[List[str]] = None, stdin: Optional[TextIO] = None, stdout: Optional[TextIO] = None) -> int:
+    arguments = parse_arguments(argv)
+    stdin, stdout = stdin or sys.stdin, stdout or sys.stdout
+    api = build_client(arguments=arguments, settings=load_settings(config=arguments.config, profile=arguments.profile))
+
+    from management_api_tools.utils.concurrency import map_concurrently
+
+    # Operations are read lazily, at most `window` ahead of the results written, so memory stays flat however long
+    # the input is and a slow reader of stdout slows the reading of stdin.
+    all_ok = True
+    results = map_concurrently(lambda item: run_operation(api, item[1]), read_operations(stdin),
+                               max_workers=arguments.max_workers, ordered=arguments.ordered, window=arguments.window)
+    try:
+        for result in results:
+            all_ok = all_ok and result.ok
+            stdout.write(json.dumps(result_record(result), separators=(',', ':'), ensure_ascii=False) + '\n')
+            stdout.flush()
+    except BrokenPipeError:
+        all_ok = False
+    finally:
+        results.close()
+        api.api_session.close()
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" The Machina client, combining every API. """
+
+from management_api_tools.api import Metrics, DataPolicies
+
+
+class Machina(Metrics, DataPolicies):
+    pass
@@ -0,0 +1,71 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Run the same operation across many Machina tenants over one shared connection pool. """
+
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from requests.adapters import HTTPAdapter
+
+from management_api_tools import Machina
+from management_api_tools.utils.adapters import (ConcurrencyLimitAdapter, SharedAdapter, innermost_adapter,
+                                                 replace_innermost_adapter)
+from management_api_tools.utils.auth import API_URL
+from management_api_tools.utils.concurrency import BatchResult, map_concurrently
+
+
+class MachinaFleet:
+    """
+    A set of authenticated tenants sharing one pool of connections to the API, so each tenant reuses warm TLS
+    connections instead of opening its own. The fleet owns the pool: a tenant's `configure_connection_pool` leaves it
+    unchanged.
+    At most `max_requests` requests are in flight across the fleet, and each tenant's own requests are limited to
+    `per_tenant_requests` by its request scheduler, which also retries rate-limited calls.
+    """
+
+    def __init__(self, max_tenants: int = 16, max_requests: int = 64, per_tenant_requests: int = 8,
+                 retries: int = 5, api_url: str = API_URL) -> None:
+        self.max_tenants = max_tenants
+        self.per_tenant_requests = min(per_tenant_requests, max_requests)
+        self.retries = retries
+        self.api_url = api_url
+        self.tenants: Dict[str, Machina] = {}
+        self.adapter = ConcurrencyLimitAdapter(limit=max_requests,
+                                               adapter=HTTPAdapter(pool_connections=1, pool_maxsize=max_requests))
+
+    def add_tenant(self, instance_id: str, authentication: str, **credentials: str) -> Machina:
+        """
+        Add a tenant, authenticated with 'basic', 'bearer', or 'hmac' and the keyword arguments that method expects.
+        Example: fleet.add_tenant(instance_id='ABC123', authentication='hmac', identity='...', secret='...')
+        """
+        machina = Machina(instance_id=instance_id, api_url=self.api_url)
+        getattr(machina, f'{authentication}_authentication')(**credentials)
+
+        tenant_adapter = machina.api_session.get_adapter(url=self.api_url)
+        tenant_pool = innermost_adapter(tenant_adapter)
+        machina.api_session.mount(prefix=self.api_url, adapter=replace_innermost_adapter(
+            adapter=tenant_adapter, replacement=SharedAdapter(adapter=self.adapter)))
+        tenant_pool.close()
+        machina.enable_scheduler(retries=self.retries, initial_concurrency=self.per_tenant_requests,
+                                 max_concurrency=self.per_tenant_requests)
+        self.tenants[instance_id] = machina
+        return machina
+
+    def run(self, operation: Callable[[Machina], Any],
+            instance_ids: Optional[Iterable[str]] = None) -> Dict[str, BatchResult]:
+        """
+        Call `operation` with each tenant's Machina, up to `max_tenants` tenants at a time.
+        Returns a BatchResult per instance_id; a failure in one tenant does not abort the others.
+        """
+        instance_ids = list(self.tenants if instance_ids is None else instance_ids)
+
+        def run_tenant(instance_id: str) -> Any:
+            return operation(self.tenants[instance_id])
+
+        return {result.item: result
+                for result in map_concurrently(run_tenant, instance_ids, max_workers=self.max_tenants)}
+
+    def close(self) -> None:
+        """ Close the shared connection pool and every tenant's session. """
+        for machina in self.tenants.values():
+            machina.api_session.close()
+        self.adapter.close()
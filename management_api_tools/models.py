@@ -0,0 +1,196 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Compact models for data policies and metric points, for holding many of them in memory. """
+
+from typing import Any, Iterator, Mapping, Optional, Tuple, Union
+import hashlib
+import json
+import sys
+
+from management_api_tools.utils.buckets import TIMESTAMP, VALUE, parse_time, to_epoch
+from management_api_tools.utils.documents import POLICY_FIELDS, SERVER_FIELDS
+from management_api_tools.utils.streaming import iter_members
+
+ISO_TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Short values repeated across most policies, shared rather than stored once per policy.
+INTERNED_FIELDS = ('status', 'ruleCombiningAlgId')
+
+MISSING: Any = object()
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+class Policy:
+    """
+    A data policy stored in slots rather than a dict. When built from JSON, `rules` is kept as raw bytes and decoded
+    on first access, and `to_json` copies untouched rules through without encoding them again.
+    `digest` is the content hash of the policy fields, as `policy_hash` computes it, so it ignores the server-managed
+    `id`; hashing and equality use both the `id` and the digest. Fields that were absent read as None and are left
+    out of `to_json` and `to_dict`, while fields that were null are kept. Fields other than the documented ones are
+    kept in `extra`, and are serialized, hashed, and indexed like them.
+    """
+    __slots__ = ('id', 'policyId', 'status', 'enabled', 'description', 'ruleCombiningAlgId', 'extra',
+                 '_rules', '_raw_rules', '_digest')
+
+    def __init__(self, policyId: str, id: str = MISSING, status: str = MISSING, enabled: bool = MISSING,
+                 description: str = MISSING, ruleCombiningAlgId: str = MISSING, rules: Any = MISSING,
+                 **extra: Any) -> None:
+        object.__setattr__(self, '_raw_rules', None)
+        if rules is not MISSING:
+            self.rules = rules
+        self.extra = extra
+        for name, value in (('policyId', policyId), ('id', id), ('status', status), ('enabled', enabled),
+                            ('description', description), ('ruleCombiningAlgId', ruleCombiningAlgId)):
+            if value is not MISSING:
+                setattr(self, name, sys.intern(value) if name in INTERNED_FIELDS and isinstance(value, str) else value)
+
+    @classmethod
+    def from_dict(cls, policy: Mapping[str, Any]) -> 'Policy':
+        """ Build a policy from a decoded policy. """
+        return cls(**policy)
+
+    @classmethod
+    def from_json(cls, text: Union[str, bytes]) -> 'Policy':
+        """ Build a policy from its JSON text, decoding every field but `rules`. """
+        text = text.decode() if isinstance(text, bytes) else text
+        members = dict(iter_members(text))
+        raw_rules = members.pop('rules', None)
+        policy = cls(**{name: json.loads(value) for name, value in members.items()})
+        if raw_rules is not None:
+            object.__setattr__(policy, '_raw_rules', raw_rules.encode())
+        return policy
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for unassigned slots, i.e. fields absent from the policy.
+        if name in self.__slots__:
+            return None
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_digest', None)
+
+    def __getitem__(self, key: str) -> Any:
+        """ Read a present field by name, so code written for policy dicts also accepts policies. """
+        if key in self.extra:
+            return self.extra[key]
+        if key not in SERVER_FIELDS + POLICY_FIELDS or not self._has(key):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    @property
+    def rules(self) -> Any:
+        if self._raw_rules is not None:
+            # Decoded rules can be changed in place, so the digest can no longer be kept.
+            object.__setattr__(self, '_rules', json.loads(self._raw_rules))
+            object.__setattr__(self, '_raw_rules', None)
+            object.__setattr__(self, '_digest', None)
+        return self._rules
+
+    @rules.setter
+    def rules(self, value: Any) -> None:
+        object.__setattr__(self, '_rules', value)
+        object.__setattr__(self, '_raw_rules', None)
+
+    def _assigned(self, name: str) -> bool:
+        try:
+            object.__getattribute__(self, name)
+        except AttributeError:
+            return False
+        return True
+
+    def _has(self, name: str) -> bool:
+        if name == 'rules':
+            return self._raw_rules is not None or self._assigned('_rules')
+        return self._assigned(name)
+
+    def __getstate__(self) -> dict:
+        return {name: object.__getattribute__(self, name) for name in self.__slots__ if self._assigned(name)}
+
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def _members(self) -> Iterator[Tuple[str, str]]:
+        """ Yield the JSON text of each present field but the server-assigned ones, in sorted order. """
+        for name in sorted(set(POLICY_FIELDS).union(self.extra).difference(SERVER_FIELDS)):
+            if name in self.extra:
+                yield name, _encode(self.extra[name])
+            elif name == 'rules' and self._raw_rules is not None:
+                yield name, self._raw_rules.decode()
+            elif self._has(name):
+                yield name, _encode(getattr(self, name))
+
+    def to_json(self) -> str:
+        """ Serialize the policy fields to the policy_document form `create_policy` and `update_policy` expect. """
+        return '{' + ','.join(f'{_encode(name)}:{value}' for name, value in self._members()) + '}'
+
+    def to_dict(self) -> dict:
+        """ Return the present fields as a dict, including `id` and the extra fields. """
+        policy = {name: getattr(self, name) for name in SERVER_FIELDS + POLICY_FIELDS if self._has(name)}
+        policy.update(self.extra)
+        return policy
+
+    @property
+    def digest(self) -> str:
+        """
+        The content hash of the policy fields, equal to `policy_hash(policy.to_dict())`. It is kept until a field is
+        assigned, but only while no field can change in place: the rules are undecoded and there are no extra fields.
+        """
+        if self._digest is not None:
+            return self._digest
+        if self._raw_rules is not None:
+            # Raw rules keep the server's key order; store them in canonical form so the hash is stable.
+            object.__setattr__(self, '_raw_rules', _encode(json.loads(self._raw_rules)).encode())
+        digest = hashlib.sha256(self.to_json().encode()).hexdigest()
+        if (self._raw_rules is not None or self._rules is None) and not self.extra:
+            object.__setattr__(self, '_digest', digest)
+        return digest
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Policy):
+            return NotImplemented
+        return (self.id, self.digest) == (other.id, other.digest)
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.digest))
+
+    def __repr__(self) -> str:
+        return f'Policy(id={self.id!r}, policyId={self.policyId!r})'
+
+
+class MetricPoint:
+    """ One metric point, with its timestamp as epoch seconds. Hashing and equality are by (timestamp, value). """
+    __slots__ = ('timestamp', 'value')
+
+    def __init__(self, timestamp: int, value: Optional[float]) -> None:
+        self.timestamp = timestamp
+        self.value = value
+
+    @classmethod
+    def from_dict(cls, point: Mapping[str, Any]) -> 'MetricPoint':
+        """ Build a point from a decoded metrics point. """
+        return cls(timestamp=to_epoch(point[TIMESTAMP]), value=point.get(VALUE))
+
+    @classmethod
+    def from_json(cls, text: Union[str, bytes]) -> 'MetricPoint':
+        """ Build a point from its JSON text. """
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self) -> dict:
+        """ Return the point in the metrics response shape. """
+        return {TIMESTAMP: parse_time(self.timestamp).strftime(ISO_TIME_FORMAT), VALUE: self.value}
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, MetricPoint):
+            return NotImplemented
+        return (self.timestamp, self.value) == (other.timestamp, other.value)
+
+    def __hash__(self) -> int:
+        return hash((self.timestamp, self.value))
+
+    def __repr__(self) -> str:
+        return f'MetricPoint(timestamp={self.timestamp!r}, value={self.value!r})'
@@ -0,0 +1,144 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Columnar metrics results backed by NumPy arrays. Requires the `series` extra (numpy). """
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError as error:  # pragma: no cover
+    raise ImportError('Metric series require numpy: python -m pip install "management_api_tools[series]"') from error
+
+from management_api_tools.utils.buckets import POINTS, TIMESTAMP, VALUE, parse_bucket, to_epoch
+
+AGGREGATIONS = ('sum', 'mean', 'min', 'max', 'last')
+
+
+@dataclass
+class MetricSeries:
+    """
+    A metric as two contiguous arrays: int64 epoch-second timestamps in ascending order, and float64 values.
+    Aggregation and export operate on whole arrays rather than on per-point Python objects.
+    """
+    metric: str
+    bucket: str
+    timestamps: np.ndarray = field(repr=False)
+    values: np.ndarray = field(repr=False)
+
+    def __post_init__(self) -> None:
+        self.timestamps = np.ascontiguousarray(self.timestamps, dtype=np.int64)
+        self.values = np.ascontiguousarray(self.values, dtype=np.float64)
+        if self.timestamps.shape != self.values.shape:
+            raise ValueError('timestamps and values must have the same length')
+
+    @classmethod
+    def from_points(cls, points: Sequence[Mapping[str, Any]], metric: str, bucket: str) -> 'MetricSeries':
+        """ Build a series from metrics API points, sorted by timestamp. """
+        timestamps = np.fromiter((to_epoch(point[TIMESTAMP]) for point in points), dtype=np.int64, count=len(points))
+        values = np.fromiter((point[VALUE] for point in points), dtype=np.float64, count=len(points))
+        order = np.argsort(timestamps, kind='stable')
+        return cls(metric=metric, bucket=bucket, timestamps=timestamps[order], values=values[order])
+
+    @classmethod
+    def from_response(cls, body: Mapping[str, Any], metric: Optional[str] = None,
+                      bucket: Optional[str] = None) -> 'MetricSeries':
+        """ Build a series from a decoded metrics response, such as `metrics(...).json()` or `metrics_range(...)`. """
+        return cls.from_points(points=body.get(POINTS, []), metric=metric or body.get('metric'),
+                               bucket=bucket or body.get('bucket'))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        return zip(self.timestamps.tolist(), self.values.tolist())
+
+    def sum(self) -> float:
+        return float(np.nansum(self.values))
+
+    def mean(self) -> float:
+        return float(np.nanmean(self.values)) if len(self) else float('nan')
+
+    def rebucket(self, bucket: str, how: str = 'sum') -> 'MetricSeries':
+        """ Aggregate into larger buckets, such as '1h' to '1d', with one of `AGGREGATIONS`. """
+        if how not in AGGREGATIONS:
+            raise ValueError(f'Unsupported aggregation {how!r}, expected one of {AGGREGATIONS}')
+        if not len(self):
+            return MetricSeries(metric=self.metric, bucket=bucket, timestamps=self.timestamps, values=self.values)
+
+        size = int(parse_bucket(bucket).total_seconds())
+        keys = self.timestamps - self.timestamps % size
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+        if how == 'last':
+            values = self.values[np.r_[starts[1:] - 1, len(self) - 1]]
+        elif how == 'mean':
+            values = np.add.reduceat(self.values, starts) / np.diff(np.r_[starts, len(self)])
+        else:
+            values = getattr(np, {'sum': 'add', 'min': 'minimum', 'max': 'maximum'}[how]).reduceat(self.values, starts)
+
+        return MetricSeries(metric=self.metric, bucket=bucket, timestamps=keys[starts], values=values)
+
+    def rate(self) -> 'MetricSeries':
+        """ Change per second between consecutive points, stamped at the later point. """
+        values = np.diff(self.values) / np.diff(self.timestamps)
+        return MetricSeries(metric=self.metric, bucket=self.bucket, timestamps=self.timestamps[1:], values=values)
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """ Return the columns without copying, e.g. for `pyarrow.table(series.to_columns())`. """
+        return {'timestamp': self.timestamps, 'value': self.values}
+
+    def to_npy(self, path: Union[str, Path]) -> None:
+        """ Save as a structured NumPy array with `timestamp` and `value` fields. """
+        MetricTable(timestamps=self.timestamps, columns={'value': self.values}).to_npy(path)
+
+    def to_csv(self, path: Union[str, Path]) -> None:
+        MetricTable(timestamps=self.timestamps, columns={'value': self.values}).to_csv(path)
+
+
+@dataclass
+class MetricTable:
+    """ Several metrics aligned on shared timestamps, one float64 column per metric. Missing buckets are NaN. """
+    timestamps: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, metric: str) -> np.ndarray:
+        return self.columns[metric]
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """ Return the columns without copying, e.g. for `pyarrow.table(table.to_columns())`. """
+        return {'timestamp': self.timestamps, **self.columns}
+
+    def to_records(self) -> np.ndarray:
+        """ Return a structured array with a `timestamp` field and a field per metric. """
+        dtype = [('timestamp', np.int64)] + [(name, np.float64) for name in self.columns]
+        records = np.empty(len(self), dtype=dtype)
+        for name, column in self.to_columns().items():
+            records[name] = column
+        return records
+
+    def to_npy(self, path: Union[str, Path]) -> None:
+        np.save(Path(path).expanduser(), self.to_records(), allow_pickle=False)
+
+    def to_csv(self, path: Union[str, Path]) -> None:
+        header = ','.join(['timestamp', *self.columns])
+        data = np.column_stack([self.timestamps, *self.columns.values()])
+        np.savetxt(Path(path).expanduser(), data, delimiter=',', header=header, comments='',
+                   fmt=['%d'] + ['%.17g'] * len(self.columns))
+
+
+def align(series: Iterable[MetricSeries], fill: float = float('nan')) -> MetricTable:
+    """ Align several series on the union of their timestamps, filling missing buckets with `fill`. """
+    series = list(series)
+    timestamps = np.unique(np.concatenate([item.timestamps for item in series])) if series else np.empty(0, np.int64)
+
+    columns = {}
+    for item in series:
+        column = np.full(len(timestamps), fill, dtype=np.float64)
+        column[np.searchsorted(timestamps, item.timestamps)] = item.values
+        columns[item.metric] = column
+    return MetricTable(timestamps=timestamps, columns=columns)
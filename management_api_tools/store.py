@@ -0,0 +1,126 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" A persistent, memory-mapped store of metric points. Requires the `series` extra (numpy). """
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import json
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+from management_api_tools.series import MetricSeries
+from management_api_tools.utils.buckets import TimeLike, floor_time, parse_bucket, parse_time, to_epoch
+
+RECORD = np.dtype([('timestamp', '<i8'), ('value', '<f8')])
+Interval = Tuple[int, int]
+
+
+class MetricStore:
+    """
+    Metric points on disk, one file of fixed-size records per (instance_id, metric, bucket), read through a memory map.
+    The store records which [start, end) epoch ranges it holds, so only the gaps need to be requested. The most
+    recent `mutable_buckets` buckets, including the one in progress, are never recorded as held and are re-fetched.
+    """
+
+    def __init__(self, directory: Union[str, Path], mutable_buckets: int = 2) -> None:
+        self.directory = Path(directory).expanduser()
+        self.mutable_buckets = mutable_buckets
+        self._locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def lock(self, instance_id: str, metric: str, bucket: str) -> threading.Lock:
+        """ Return the lock that serializes updates to one key. """
+        with self._locks_lock:
+            return self._locks.setdefault((instance_id, metric, bucket), threading.Lock())
+
+    def _path(self, instance_id: str, metric: str, bucket: str) -> Path:
+        parts = (re.sub(r'[^A-Za-z0-9._-]', '_', part) for part in (instance_id, metric, bucket))
+        return self.directory.joinpath(*parts)
+
+    def coverage(self, instance_id: str, metric: str, bucket: str) -> List[Interval]:
+        """ Return the sorted, disjoint [start, end) epoch ranges held for a key. """
+        path = self._path(instance_id, metric, bucket).joinpath('coverage.json')
+        return [tuple(interval) for interval in json.loads(path.read_text())] if path.exists() else []
+
+    def missing(self, instance_id: str, metric: str, bucket: str, start: TimeLike,
+                end: TimeLike) -> List[Tuple[datetime, datetime]]:
+        """ Return the bucket-aligned windows within [start, end) that must be requested from the API. """
+        bucket_size = parse_bucket(bucket)
+        cursor, stop = to_epoch(floor_time(parse_time(start), bucket_size)), to_epoch(end)
+
+        gaps = []
+        for held_start, held_end in self.coverage(instance_id, metric, bucket):
+            if held_end <= cursor:
+                continue
+            if held_start >= stop:
+                break
+            if held_start > cursor:
+                gaps.append((cursor, held_start))
+            cursor = max(cursor, held_end)
+        if cursor < stop:
+            gaps.append((cursor, stop))
+        return [(parse_time(gap_start), parse_time(gap_end)) for gap_start, gap_end in gaps]
+
+    def read(self, instance_id: str, metric: str, bucket: str, start: TimeLike, end: TimeLike) -> MetricSeries:
+        """ Return the held points within [start, end]. The arrays are copied out of the memory map. """
+        path = self._path(instance_id, metric, bucket).joinpath('points.dat')
+        if path.exists() and path.stat().st_size:
+            records = np.memmap(path, dtype=RECORD, mode='r')
+        else:
+            records = np.empty(0, RECORD)
+
+        first, last = np.searchsorted(records['timestamp'], [to_epoch(start), to_epoch(end)], side='left')
+        last += int(last < len(records) and records['timestamp'][last] == to_epoch(end))
+        selection = records[first:last]
+        return MetricSeries(metric=metric, bucket=bucket, timestamps=np.array(selection['timestamp']),
+                            values=np.array(selection['value']))
+
+    def write(self, series: MetricSeries, instance_id: str, start: TimeLike, end: TimeLike) -> None:
+        """
+        Merge fetched points into the store, replacing held points with the same timestamp, and record [start, end)
+        as held, excluding the mutable buckets near now. Call while holding `lock(...)` for the key.
+        """
+        key_path = self._path(instance_id, series.metric, series.bucket)
+        key_path.mkdir(parents=True, exist_ok=True)
+        points_path = key_path.joinpath('points.dat')
+
+        held = np.fromfile(points_path, dtype=RECORD) if points_path.exists() else np.empty(0, RECORD)
+        fetched = np.empty(len(series), dtype=RECORD)
+        fetched['timestamp'], fetched['value'] = series.timestamps, series.values
+
+        # Fetched points come last, so a stable sort followed by keeping the last of each timestamp prefers them.
+        merged = np.concatenate([held, fetched])
+        merged = merged[np.argsort(merged['timestamp'], kind='stable')]
+        keep = np.r_[merged['timestamp'][1:] != merged['timestamp'][:-1], True] if len(merged) else np.empty(0, bool)
+        self._replace(points_path, merged[keep].tobytes())
+
+        bucket_size = parse_bucket(series.bucket)
+        mutable_from = floor_time(datetime.now(timezone.utc), bucket_size) - bucket_size * (self.mutable_buckets - 1)
+        interval = (to_epoch(start), min(to_epoch(end), to_epoch(mutable_from)))
+        if interval[0] < interval[1]:
+            coverage = merge_intervals(self.coverage(instance_id, series.metric, series.bucket) + [interval])
+            self._replace(key_path.joinpath('coverage.json'), json.dumps(coverage).encode())
+
+    @staticmethod
+    def _replace(path: Path, content: bytes) -> None:
+        """ Write a file atomically, so readers never see a partial write. """
+        descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """ Merge overlapping or adjacent [start, end) intervals. """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
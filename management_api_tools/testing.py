@@ -0,0 +1,240 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" A local stand-in for the Machina API, for offline tests and benchmarks. """
+
+from collections import Counter
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+
+from management_api_tools.utils.buckets import floor_time, parse_bucket, parse_time
+from management_api_tools.utils.instrumentation import endpoint_name
+
+Latency = Union[float, Tuple[float, float]]
+
+
+class FakeMachina:
+    """
+    Serve /policies and /metrics for any instance_id from memory, on an ephemeral localhost port.
+    `latency` is a delay in seconds, or a (minimum, maximum) range, added to every response. A fraction `error_rate`
+    of requests fail with 500, and a fraction `throttle_rate` with 429 and a Retry-After of `retry_after` seconds.
+    If `hmac_credentials` maps identities to secrets, HMAC signatures are validated and bad ones rejected with 401.
+    GET responses carry an ETag and honour If-None-Match.
+    """
+
+    def __init__(self, latency: Latency = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 0.0, hmac_credentials: Optional[Dict[str, str]] = None, seed: int = 0) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.hmac_credentials = hmac_credentials or {}
+        self.policies: Dict[str, Dict[str, dict]] = {}
+        self.requests: Counter = Counter()
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def api_url(self) -> str:
+        """ The URL to pass as `api_url` to Machina. """
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v2'
+
+    def start(self) -> 'FakeMachina':
+        handler = type('FakeMachinaHandler', (_Handler,), {'fake': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs=dict(poll_interval=0.05), daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'FakeMachina':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def add_policies(self, instance_id: str, count: int, prefix: str = 'policy') -> None:
+        """ Seed an instance with `count` published policies. """
+        with self.lock:
+            tenant = self.policies.setdefault(instance_id, {})
+            for _ in range(count):
+                identifier = uuid.uuid4().hex[:24]
+                tenant[identifier] = dict(id=identifier, policyId=f'{prefix}-{identifier}', status='Published',
+                                          enabled=True, description='', ruleCombiningAlgId='deny-overrides',
+                                          rules=[{'ruleId': identifier[:4], 'effect': 'Permit'}])
+
+    def choose_failure(self) -> Optional[int]:
+        """ Return an injected status code, or None to serve the request normally. """
+        with self.lock:
+            roll = self._random.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def delay(self) -> None:
+        latency = self.latency
+        if isinstance(latency, tuple):
+            with self.lock:
+                latency = self._random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+    def verify_signature(self, method: str, path: str, headers) -> bool:
+        """ Check an IONIC Authorization header against the configured secrets. """
+        authorization = headers.get('Authorization', '')
+        if not authorization.startswith('IONIC '):
+            return True
+        identity, _, signature = authorization[len('IONIC '):].partition(':')
+        secret = self.hmac_credentials.get(identity)
+        if secret is None:
+            return False
+        string_to_sign = '\n'.join([method, headers.get('Content-MD5', ''), headers.get('Content-Type', ''),
+                                    headers.get('Date', ''), path])
+        expected = hmac.new(base64.b64decode(secret), string_to_sign.encode(), hashlib.sha1).digest()
+        return hmac.compare_digest(base64.b64encode(expected).decode(), signature)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffer each response into a single write, and send it immediately, so delayed ACKs don't add latency.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    fake: FakeMachina
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._dispatch()
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def _reply(self, status: int, body: Optional[object] = None, headers: Optional[Dict[str, str]] = None) -> None:
+        content = b'' if body is None else json.dumps(body).encode()
+        headers = dict(headers or {})
+        if self.command == 'GET' and status == 200:
+            headers['ETag'] = f'"{hashlib.sha1(content).hexdigest()}"'
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status, content = 304, b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, status: int, message: str) -> None:
+        self._reply(status, {'detail': {'message': message}})
+
+    def _dispatch(self) -> None:
+        fake = self.fake
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with fake.lock:
+            fake.requests[endpoint_name(self.command, url.path)] += 1
+
+        fake.delay()
+        if not fake.verify_signature(self.command, url.path, self.headers):
+            return self._error(401, 'Invalid HMAC signature')
+        failure = fake.choose_failure()
+        if failure == 429:
+            return self._reply(429, {'detail': {'message': 'Too many requests'}},
+                               headers={'Retry-After': f'{fake.retry_after:g}'})
+        if failure:
+            return self._error(failure, 'Injected failure')
+
+        # /v2/{instance_id}/{resource}[/{identifier}]
+        _, _, instance_id, resource, *rest = url.path.split('/') + ['']
+        identifier = rest[0] if rest else ''
+        trailing_slash = url.path.endswith('/')
+        try:
+            document = json.loads(body) if body else None
+        except ValueError:
+            return self._error(400, 'Malformed JSON')
+
+        if resource == 'metrics' and self.command == 'GET':
+            return self._reply(200, metrics_body(query))
+        if resource != 'policies':
+            return self._error(404, 'Not found')
+
+        with fake.lock:
+            tenant = fake.policies.setdefault(instance_id, {})
+            status, reply = policies_endpoint(tenant, self.command, identifier, trailing_slash, query, document)
+        self._reply(status, reply)
+
+
+def policies_endpoint(tenant: Dict[str, dict], method: str, identifier: str, trailing_slash: bool, query: dict,
+                      document) -> Tuple[int, Optional[object]]:
+    """ Apply a /policies request to one tenant's policies, returning the status and body. """
+    not_found = (404, {'detail': {'message': f'Policy {identifier} not found'}})
+
+    if method == 'GET' and not identifier:
+        policies = [tenant[key] for key in sorted(tenant)]
+        skip, limit = int(query.get('skip', 0)), int(query.get('limit', 100))
+        return 200, {'totalResults': len(policies), 'skip': skip, 'limit': limit,
+                     'Resources': policies[skip:skip + limit]}
+    if method == 'GET':
+        return (200, tenant[identifier]) if identifier in tenant else not_found
+    if method == 'POST' and trailing_slash:
+        created = dict(document, id=uuid.uuid4().hex[:24])
+        tenant[created['id']] = created
+        return 201, created
+    if method == 'POST':
+        documents = document if isinstance(document, list) else [document]
+        by_policy_id = {policy['policyId']: key for key, policy in tenant.items()}
+        if query.get('merge') == 'replace':
+            wanted = {policy['policyId'] for policy in documents}
+            for policy_id, key in list(by_policy_id.items()):
+                if policy_id not in wanted:
+                    del tenant[key]
+        results, status = [], 200
+        for policy in documents:
+            key = by_policy_id.get(policy['policyId'])
+            if key is None:
+                key, status = uuid.uuid4().hex[:24], 201
+            tenant[key] = dict(policy, id=key)
+            results.append(tenant[key])
+        return status, {'Resources': results}
+    if method == 'PUT':
+        if identifier not in tenant:
+            return not_found
+        tenant[identifier] = dict(document, id=identifier)
+        return 200, tenant[identifier]
+    if method == 'DELETE':
+        return (204, None) if tenant.pop(identifier, None) is not None else not_found
+    return 405, {'detail': {'message': 'Method not allowed'}}
+
+
+def metrics_body(query: dict) -> dict:
+    """ Generate deterministic points for every bucket in [start, end]. """
+    bucket = query.get('bucket', '1d')
+    bucket_size = parse_bucket(bucket)
+    end = parse_time(query.get('end', 'now'))
+    start = floor_time(parse_time(query['start']) if 'start' in query else end - timedelta(days=1), bucket_size)
+
+    points, timestamp = [], start
+    while timestamp <= end:
+        epoch = int(timestamp.timestamp())
+        points.append({'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%SZ'), 'value': epoch // 60 % 97})
+        timestamp += bucket_size
+    return {'metric': query.get('metric'), 'bucket': bucket, 'points': points}
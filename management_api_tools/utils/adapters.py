@@ -0,0 +1,109 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Transport adapters layered around the connection pool of `MachinaLogin.api_session`. """
+
+from typing import Optional
+import threading
+
+from requests.adapters import BaseAdapter
+import requests
+
+
+class AdapterWrapper(BaseAdapter):
+    """
+    Delegate to an inner transport adapter. Subclasses add behaviour around `send`.
+    Wrappers are stacked by `layer`: a wrapper with a higher layer sits further from the connection pool.
+    """
+    layer = 0
+
+    def __init__(self, adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__()
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        return self.adapter.send(request, **kwargs)
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+class ConcurrencyLimitAdapter(AdapterWrapper):
+    """ Allow at most `limit` requests in flight through this adapter, from any number of sessions. """
+    layer = 5
+
+    def __init__(self, limit: int, adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__(adapter=adapter)
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        with self._semaphore:
+            return read_body(self.adapter.send(request, **kwargs), stream=kwargs.get('stream', False))
+
+
+class SharedAdapter(BaseAdapter):
+    """
+    One session's handle on an adapter stack shared with other sessions, such as the pool of a MachinaFleet.
+    It is not an AdapterWrapper, so changes a session makes to its own wrappers or pool stop here, and closing the
+    session leaves the shared stack open; its owner sizes and closes it.
+    """
+
+    def __init__(self, adapter: BaseAdapter) -> None:
+        super().__init__()
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        return self.adapter.send(request, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+def read_body(response: requests.Response, stream: bool) -> requests.Response:
+    """
+    Read the body now unless the caller asked to stream it, so the connection returns to the pool before a concurrency
+    limit is released. Otherwise requests reads the body after `send` returns, outside the limit.
+    """
+    if not stream:
+        response.content
+    return response
+
+
+def innermost_adapter(adapter: BaseAdapter) -> BaseAdapter:
+    """ Return the adapter that owns the connection pool, beneath any wrappers. """
+    while isinstance(adapter, AdapterWrapper):
+        adapter = adapter.adapter
+    return adapter
+
+
+def replace_innermost_adapter(adapter: BaseAdapter, replacement: BaseAdapter) -> BaseAdapter:
+    """ Swap the adapter that owns the connection pool, keeping any wrappers. Returns the outermost adapter. """
+    if not isinstance(adapter, AdapterWrapper):
+        return replacement
+
+    wrapper = adapter
+    while isinstance(wrapper.adapter, AdapterWrapper):
+        wrapper = wrapper.adapter
+    wrapper.adapter = replacement
+    return adapter
+
+
+def insert_wrapper(adapter: BaseAdapter, wrapper: AdapterWrapper) -> BaseAdapter:
+    """
+    Insert a wrapper into a stack of adapters according to its layer, replacing any wrapper already in that layer.
+    Returns the outermost adapter.
+    """
+    def beneath(inner: BaseAdapter) -> BaseAdapter:
+        if isinstance(inner, AdapterWrapper) and inner.layer == wrapper.layer:
+            return inner.adapter
+        return inner
+
+    if not isinstance(adapter, AdapterWrapper) or adapter.layer <= wrapper.layer:
+        wrapper.adapter = beneath(adapter)
+        return wrapper
+
+    parent = adapter
+    while isinstance(parent.adapter, AdapterWrapper) and parent.adapter.layer > wrapper.layer:
+        parent = parent.adapter
+    wrapper.adapter, parent.adapter = beneath(parent.adapter), wrapper
+    return adapter
@@ -3,24 +3,121 @@
 """ Machina Authentication. """
 
 from dataclasses import dataclass, field
-from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Mapping, Dict, Optional, Tuple, Union
 import hashlib
 import base64
 import hmac
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
 
+from management_api_tools.utils.adapters import (AdapterWrapper, SharedAdapter, innermost_adapter, insert_wrapper,
+                                                 replace_innermost_adapter)
+from management_api_tools.utils.cache import CachingAdapter, ResponseCache
+from management_api_tools.utils.coalesce import CoalescingAdapter, SingleFlight
+from management_api_tools.utils.instrumentation import InstrumentingAdapter, RequestStats
+from management_api_tools.utils.scheduler import RequestScheduler, SchedulingAdapter
+
+API_URL = 'https://api.ionic.com/v2'
+DEFAULT_CONTENT_TYPE = 'application/json; charset=UTF-8'
+
 
 @dataclass
 class MachinaLogin:
     """ Authenticate to the Machina API. """
     instance_id: str
+    api_url: str = field(default=API_URL, repr=False)
     instance_url: str = field(init=False, default=None)
     api_session: requests.Session = field(init=False, repr=False, default_factory=requests.Session)
+    response_cache: Optional[ResponseCache] = field(init=False, repr=False, default=None)
+    scheduler: Optional[RequestScheduler] = field(init=False, repr=False, default=None)
+    single_flight: Optional[SingleFlight] = field(init=False, repr=False, default=None)
+    instrumentation: RequestStats = field(init=False, repr=False, default_factory=RequestStats)
 
     def __post_init__(self) -> None:
-        self.instance_url = f'https://api.ionic.com/v2/{self.instance_id}'
+        self.instance_url = f'{self.api_url}/{self.instance_id}'
+        self.mount_wrapper(wrapper=InstrumentingAdapter(stats=self.instrumentation))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return request counts, bytes, status codes, and latency histograms per endpoint, along with the cache,
+        scheduler, and coalescing counters when those are enabled. Sinks for other systems are added with
+        `instrumentation.add_sink`.
+        """
+        stats: Dict[str, Any] = {'endpoints': self.instrumentation.snapshot()}
+        if self.response_cache is not None:
+            stats['cache'] = self.response_cache.stats()
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats()
+        if self.single_flight is not None:
+            stats['coalescing'] = self.single_flight.stats()
+        return stats
+
+    def configure_connection_pool(self, pool_maxsize: int) -> None:
+        """
+        Keep up to `pool_maxsize` connections open to the API, so that many threads can share `api_session`.
+        The default pool holds 10 connections; threads beyond that open and discard a new connection per request.
+        A pool shared with other sessions, such as a MachinaFleet's, is sized by its owner and left unchanged.
+        """
+        adapter = self.api_session.get_adapter(url=self.api_url)
+        pool = innermost_adapter(adapter)
+        if isinstance(pool, SharedAdapter):
+            return
+        if getattr(pool, '_pool_maxsize', 0) < pool_maxsize:
+            adapter = replace_innermost_adapter(adapter=adapter, replacement=HTTPAdapter(pool_maxsize=pool_maxsize))
+            self.api_session.mount(prefix=self.api_url, adapter=adapter)
+            pool.close()
+
+    def mount_wrapper(self, wrapper: AdapterWrapper) -> None:
+        """
+        Add a transport wrapper, such as a cache or scheduler, around the connection pool used for the API, in place of
+        any wrapper already in its layer.
+        """
+        adapter = self.api_session.get_adapter(url=self.api_url)
+        self.api_session.mount(prefix=self.api_url, adapter=insert_wrapper(adapter=adapter, wrapper=wrapper))
+
+    def enable_cache(self, maxsize: int = 256, ttl: float = 60.0,
+                     directory: Optional[Union[str, Path]] = None) -> ResponseCache:
+        """
+        Cache successful GET responses in memory, and optionally on disk, and revalidate them with conditional requests.
+        Successful writes through DataPolicies invalidate the affected entries. Returns the cache, which exposes
+        hit and miss counters through `stats()`. Enabling it again replaces the previous cache, which is closed.
+        """
+        if self.response_cache is not None:
+            self.response_cache.close()
+        self.response_cache = ResponseCache(maxsize=maxsize, ttl=ttl, directory=directory)
+        self.mount_wrapper(wrapper=CachingAdapter(cache=self.response_cache))
+        return self.response_cache
+
+    def enable_scheduler(self, retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                         initial_concurrency: int = 8, max_concurrency: int = 64) -> RequestScheduler:
+        """
+        Retry rate-limited and failed requests, and adapt the number of requests in flight to server pushback.
+        Idempotent requests are retried with jittered exponential backoff, honouring Retry-After; every request
+        shares one AIMD concurrency limit, so bulk operations settle near the tenant's throughput ceiling.
+        """
+        self.scheduler = RequestScheduler(retries=retries, backoff=backoff, max_backoff=max_backoff,
+                                          initial_concurrency=initial_concurrency, max_concurrency=max_concurrency)
+        self.mount_wrapper(wrapper=SchedulingAdapter(scheduler=self.scheduler, session=self.api_session))
+        self.configure_connection_pool(pool_maxsize=max_concurrency)
+        return self.scheduler
+
+    def enable_coalescing(self) -> SingleFlight:
+        """
+        Share one request among identical GETs in flight at the same time, such as many threads fetching the same
+        policy or metrics at once. Returns the single-flight group, which counts shared calls through `stats()`.
+        """
+        self.single_flight = SingleFlight()
+        self.mount_wrapper(wrapper=CoalescingAdapter(flights=self.single_flight))
+        return self.single_flight
+
+    def invalidate_cache(self, url: str, descendants: bool = False) -> None:
+        """ Remove cached responses for a URL, if the cache is enabled. """
+        if self.response_cache is not None:
+            self.response_cache.invalidate(url=url, descendants=descendants)
 
     def basic_authentication(self, username: str, password: str) -> None:
         """ Use Basic Authentication to authenticate with the Machina API. """
@@ -32,38 +129,76 @@ class MachinaLogin:
 
     def hmac_authentication(self, identity: str, secret: str) -> None:
         """ Use HMAC Authentication to authenticate with the Machina API. """
-        self.api_session.auth = HmacAuth(identity=identity, secret=secret)
+        self.api_session.auth = HmacAuth(identity=identity, secret=secret,
+                                         observer=self.instrumentation.observe_signing)
 
 
 @dataclass
 class HmacAuth(AuthBase):
-    """ Attaches HMAC Authentication to a given Request object. """
+    """
+    Attaches HMAC Authentication to a given Request object.
+    The secret is decoded once into a pre-keyed HMAC state, which is copied for each signature. The Date header and the
+    signatures produced within the current second are cached, since every request signed in that second shares them.
+    Safe to share between threads.
+    """
     identity: str
     secret: str
+    observer: Optional[Callable[[float], None]] = field(default=None, repr=False, compare=False)
+    _keyed_hmac: Any = field(init=False, repr=False, compare=False, default=None)
+    _date: Tuple[int, str] = field(init=False, repr=False, compare=False, default=(-1, ''))
+    _signatures: Tuple[int, Dict[str, str]] = field(init=False, repr=False, compare=False, default=(-1, None))
+
+    def __post_init__(self) -> None:
+        self._keyed_hmac = hmac.new(key=base64.b64decode(self.secret), digestmod=hashlib.sha1)
 
     def create_signature(self, string_to_sign: str) -> str:
         """ Construct a valid HMAC signature. """
-        begin_signature = hmac.new(key=base64.b64decode(self.secret),
-                                   msg=string_to_sign.encode(),
-                                   digestmod=hashlib.sha1)
+        begin_signature = self._keyed_hmac.copy()
+        begin_signature.update(string_to_sign.encode())
         end_signature = begin_signature.digest()
         final_signature = base64.b64encode(end_signature).decode()
         return final_signature
 
-    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
-        method = request.method
-        content_md5_header = request.headers.get('Content-MD5', '')
-        content_type_header = request.headers.get('Content-Type', 'application/json; charset=UTF-8')
-        date_header = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
-        path_url, *_ = request.path_url.split('?')  # Remove query parameters, else HMAC signature does not match.
+    def date_header(self, now: Optional[float] = None) -> str:
+        """ Return the Date header for the current second, formatting it at most once per second. """
+        second = int(time.time() if now is None else now)
+        cached_second, cached_header = self._date
+        if cached_second != second:
+            cached_header = time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(second))
+            # A single tuple assignment, so concurrent readers never see a mismatched second and header.
+            self._date = (second, cached_header)
+        return cached_header
+
+    def sign(self, method: str, path_url: str, headers: Mapping[str, str]) -> Dict[str, str]:
+        """ Return the headers required to sign a request, independent of the HTTP client sending it. """
+        content_md5_header = headers.get('Content-MD5', '')
+        content_type_header = headers.get('Content-Type', DEFAULT_CONTENT_TYPE)
+        second = int(time.time())
+        date_header = self.date_header(now=second)
+        path_url = path_url.partition('?')[0]  # Remove query parameters, else HMAC signature does not match.
 
         string_to_sign = f'{method}\n{content_md5_header}\n{content_type_header}\n{date_header}\n{path_url}'
-        signature = self.create_signature(string_to_sign=string_to_sign)
+        signatures_second, signatures = self._signatures
+        if signatures_second != second:
+            signatures = {}
+            self._signatures = (second, signatures)
+        signature = signatures.get(string_to_sign)
+        if signature is None:
+            signature = signatures[string_to_sign] = self.create_signature(string_to_sign=string_to_sign)
         authorization_header = f'IONIC {self.identity}:{signature}'
 
-        request.headers['Date'] = date_header
-        request.headers['Content-MD5'] = content_md5_header
-        request.headers['Content-Type'] = content_type_header
-        request.headers['Authorization'] = authorization_header
+        return {
+            'Date': date_header,
+            'Content-MD5': content_md5_header,
+            'Content-Type': content_type_header,
+            'Authorization': authorization_header,
+        }
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        started = time.perf_counter()
+        signed_headers = self.sign(method=request.method, path_url=request.path_url, headers=request.headers)
+        request.headers.update(signed_headers)
+        if self.observer is not None:
+            self.observer(time.perf_counter() - started)
 
         return request
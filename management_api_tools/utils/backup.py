@@ -0,0 +1,155 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Incremental backups of data policies, with a manifest of content hashes. """
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+import json
+import os
+import re
+import tarfile
+import tempfile
+
+from management_api_tools.utils.concurrency import map_concurrently
+from management_api_tools.utils.documents import normalize_policy, policy_hash, serialize_policy
+
+MANIFEST = 'manifest.json'
+
+
+@dataclass
+class BackupSummary:
+    """ The policyIds written, unchanged, and removed by a backup, and any whose file failed to write or remove. """
+    written: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    failed: Dict[str, BaseException] = field(default_factory=dict)
+    archive: Optional[Path] = None
+
+
+def policy_filename(policy_id: str) -> str:
+    """ Derive a file name from a policyId, replacing characters that are unsafe in a path. """
+    return re.sub(r'[^\w.\-\[\]()]', '_', policy_id.replace(' ', '_')).lstrip('.') + '.json'
+
+
+def write_atomically(path: Path, content: Union[str, bytes]) -> None:
+    """ Write to a temporary file in the same directory, then rename it over the destination. """
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.')
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(content.encode() if isinstance(content, str) else content)
+    os.replace(temporary, path)
+
+
+def read_manifest(directory: Path) -> Dict[str, Dict[str, str]]:
+    """ Return {policyId: {'hash': ..., 'filename': ...}} for a backup directory, or {} if there is none. """
+    manifest = directory.joinpath(MANIFEST)
+    return json.loads(manifest.read_text()) if manifest.exists() else {}
+
+
+def backup_policies(policies: Iterable[Mapping], directory: Union[str, Path], max_workers: int = 8,
+                    archive: Optional[Union[str, Path]] = None) -> BackupSummary:
+    """
+    Save each policy to its own JSON file, skipping policies whose content hash matches the manifest.
+    Files are written concurrently and atomically; files of policies that no longer exist are removed. If `archive`
+    is given, the directory is also packed into that single .tar.gz file.
+    """
+    directory = Path(directory).expanduser()
+    directory.mkdir(parents=True, exist_ok=True)
+    previous, manifest, summary = read_manifest(directory), {}, BackupSummary()
+    used_filenames = {MANIFEST}  # A policy named 'manifest' gets a suffixed file name.
+
+    def pending() -> Iterable[tuple]:
+        for policy in policies:
+            policy = normalize_policy(policy)
+            policy_id, content_hash = policy['policyId'], policy_hash(policy)
+            filename = policy_filename(policy_id)
+            if filename in used_filenames:
+                filename = f'{filename[:-len(".json")]}-{content_hash[:8]}.json'
+            used_filenames.add(filename)
+
+            entry = previous.get(policy_id)
+            manifest[policy_id] = {'hash': content_hash, 'filename': filename}
+            if entry == manifest[policy_id] and directory.joinpath(filename).exists():
+                summary.unchanged.append(policy_id)
+            else:
+                yield policy_id, filename, policy
+
+    def write(item: tuple) -> None:
+        policy_id, filename, policy = item
+        write_atomically(directory.joinpath(filename), json.dumps(obj=policy, indent=4))
+
+    for result in map_concurrently(write, pending(), max_workers=max_workers):
+        policy_id = result.item[0]
+        if result.error is None:
+            summary.written.append(policy_id)
+        else:
+            summary.failed[policy_id] = result.error
+            manifest.pop(policy_id, None)
+
+    # A stale file that is already gone, or cannot be removed, must not stop the new manifest from being written;
+    # once the manifest no longer lists a file, restores ignore it.
+    for policy_id, entry in previous.items():
+        if policy_id not in manifest and entry['filename'] not in used_filenames:
+            try:
+                directory.joinpath(entry['filename']).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                summary.failed[policy_id] = error
+                continue
+            summary.removed.append(policy_id)
+
+    write_atomically(directory.joinpath(MANIFEST), json.dumps(obj=manifest, indent=4, sort_keys=True))
+
+    if archive is not None:
+        summary.archive = pack_archive(directory=directory, manifest=manifest, archive=Path(archive).expanduser())
+    return summary
+
+
+def pack_archive(directory: Path, manifest: Mapping[str, Mapping[str, str]], archive: Path) -> Path:
+    """ Pack the manifest and policy files into a single .tar.gz, replacing any previous archive atomically. """
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=archive.parent, prefix=f'.{archive.name}.')
+    with os.fdopen(descriptor, 'wb') as file, tarfile.open(fileobj=file, mode='w:gz') as tar:
+        tar.add(directory.joinpath(MANIFEST), arcname=MANIFEST)
+        for entry in manifest.values():
+            tar.add(directory.joinpath(entry['filename']), arcname=entry['filename'])
+    os.replace(temporary, archive)
+    return archive
+
+
+def read_backup(path: Union[str, Path], wanted: Callable[[str, str], bool]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (policyId, policy document) for each policy in a backup directory or .tar.gz archive for which
+    `wanted(policyId, content hash)` is True. Files are read one at a time, and only when wanted; if the backup has a
+    manifest, unwanted policies are skipped without reading their files.
+    """
+    path = Path(path).expanduser()
+    if path.is_dir():
+        manifest = read_manifest(path)
+        if manifest:
+            for policy_id, entry in manifest.items():
+                if wanted(policy_id, entry['hash']):
+                    yield policy_id, serialize_policy(json.loads(path.joinpath(entry['filename']).read_text()))
+        else:
+            for file in sorted(path.glob('*.json')):
+                policy = json.loads(file.read_text())
+                if wanted(policy['policyId'], policy_hash(policy)):
+                    yield policy['policyId'], serialize_policy(policy)
+        return
+
+    # Stream the archive; backups written by pack_archive store the manifest first.
+    filenames: Dict[str, Tuple[str, str]] = {}
+    with tarfile.open(path, mode='r|gz') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            if member.name == MANIFEST:
+                manifest = json.load(archive.extractfile(member))
+                filenames = {entry['filename']: (policy_id, entry['hash']) for policy_id, entry in manifest.items()}
+                continue
+            if member.name in filenames and not wanted(*filenames[member.name]):
+                continue
+            policy = json.load(archive.extractfile(member))
+            if member.name in filenames or wanted(policy['policyId'], policy_hash(policy)):
+                yield policy['policyId'], serialize_policy(policy)
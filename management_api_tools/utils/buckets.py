@@ -0,0 +1,87 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Parse, align, and split the time windows used by the Metrics API. """
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, List, Mapping, Tuple, Union
+import re
+
+# Shape of a metrics response: {'points': [{'timestamp': ..., 'value': ...}, ...]}
+POINTS, TIMESTAMP, VALUE = 'points', 'timestamp', 'value'
+
+METRICS_TIME_FORMAT = '%Y%m%d-%H:%M'
+BUCKET_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+TimeLike = Union[datetime, str, int, float]
+
+
+def parse_bucket(bucket: str) -> timedelta:
+    """ Convert a bucket size such as '5m', '1h', or '1d' to a timedelta. """
+    match = re.fullmatch(r'(\d+)([smhdw])', bucket.strip())
+    if match is None:
+        raise ValueError(f'Unsupported bucket size: {bucket!r}')
+    count, unit = match.groups()
+    return timedelta(**{BUCKET_UNITS[unit]: int(count)})
+
+
+def parse_time(value: TimeLike) -> datetime:
+    """
+    Convert 'now', a Metrics API time ('YYYYMMDD-HH:MM'), an ISO-8601 string, or epoch seconds to a UTC datetime.
+    """
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(seconds=value)
+    if value == 'now':
+        return datetime.now(timezone.utc)
+    try:
+        return datetime.strptime(value, METRICS_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return parse_time(datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+def format_time(value: datetime) -> str:
+    """ Format a datetime the way the Metrics API expects. """
+    return value.astimezone(timezone.utc).strftime(METRICS_TIME_FORMAT)
+
+
+def to_epoch(value: TimeLike) -> int:
+    """ Return whole epoch seconds for any supported time value. """
+    return int((parse_time(value) - EPOCH).total_seconds())
+
+
+def floor_time(value: datetime, bucket: timedelta) -> datetime:
+    """ Align a time to the start of the bucket that contains it. """
+    seconds = (value - EPOCH) // timedelta(seconds=1)
+    size = bucket // timedelta(seconds=1)
+    return EPOCH + timedelta(seconds=seconds - seconds % size)
+
+
+def split_range(start: TimeLike, end: TimeLike, bucket: str,
+                chunk: Union[int, str] = 1000) -> List[Tuple[datetime, datetime]]:
+    """
+    Split [start, end) into consecutive windows that begin on bucket boundaries.
+    `chunk` is either a number of buckets per window or a duration such as '7d', rounded up to whole buckets.
+    """
+    bucket_size = parse_bucket(bucket)
+    buckets_per_chunk = chunk if isinstance(chunk, int) else -(-parse_bucket(chunk) // bucket_size)
+    if buckets_per_chunk < 1:
+        raise ValueError(f'A chunk must span at least one bucket: {chunk!r}')
+
+    window_start, window_end = floor_time(parse_time(start), bucket_size), parse_time(end)
+    windows = []
+    while window_start < window_end:
+        next_start = min(window_start + bucket_size * buckets_per_chunk, window_end)
+        windows.append((window_start, next_start))
+        window_start = next_start
+    return windows
+
+
+def stitch_points(pages: Iterable[Iterable[Mapping[str, Any]]]) -> List[Mapping[str, Any]]:
+    """ Merge the points of several windows into one series ordered by timestamp, dropping duplicate buckets. """
+    points = {}
+    for page in pages:
+        for point in page:
+            points.setdefault(to_epoch(point[TIMESTAMP]), point)
+    return [points[timestamp] for timestamp in sorted(points)]
@@ -0,0 +1,204 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Conditional-request response cache for `MachinaLogin.api_session`. """
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Optional, Union
+import hashlib
+import shelve
+import threading
+import time
+
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import requests
+
+from management_api_tools.utils.adapters import AdapterWrapper
+
+VARY_HEADERS = ('Accept', 'Authorization')
+
+
+@dataclass
+class CacheEntry:
+    """ A stored response body and the headers needed to serve or revalidate it. """
+    status_code: int
+    reason: str
+    headers: Dict[str, str]
+    content: bytes
+    stored_at: float = field(default_factory=time.monotonic)
+    stored_at_wall: float = field(default_factory=time.time)
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """ Conditional request headers, if the server supplied an ETag or Last-Modified header. """
+        headers = CaseInsensitiveDict(self.headers)
+        validators = {}
+        if 'ETag' in headers:
+            validators['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['If-Modified-Since'] = headers['Last-Modified']
+        return validators
+
+
+def cache_key(request: requests.PreparedRequest) -> str:
+    """
+    Key a request by its URL and by the `VARY_HEADERS` that select its response: the format and who is asking.
+    HMAC signatures change every second, so an IONIC Authorization header contributes only its identity. The header
+    values are hashed, so credentials are never written to the on-disk backend.
+    """
+    values = []
+    for name in VARY_HEADERS:
+        value = request.headers.get(name, '')
+        if name == 'Authorization' and value.startswith('IONIC '):
+            value = value.partition(':')[0]
+        values.append(value)
+    digest = hashlib.sha256('\n'.join(values).encode()).hexdigest()
+    return f'{request.url}#{digest}'
+
+
+class ResponseCache:
+    """
+    An in-memory LRU cache of successful GET responses, keyed by `cache_key`, with an optional on-disk backend.
+    Entries are served without a request for `ttl` seconds, then revalidated with If-None-Match/If-Modified-Since if
+    the server supplied validators. At most `maxsize` entries are held in memory; the least recently used is evicted.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, directory: Optional[Union[str, Path]] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._shelf = None
+        if directory is not None:
+            directory = Path(directory).expanduser()
+            directory.mkdir(parents=True, exist_ok=True)
+            self._shelf = shelve.open(str(directory.joinpath('responses')))
+
+    def stats(self) -> Dict[str, int]:
+        """ Return the hit, miss, and revalidation counters, and the number of entries held in memory. """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, revalidations=self.revalidations, size=len(self._entries))
+
+    def count(self, counter: str) -> None:
+        """ Increment the `hits`, `misses`, or `revalidations` counter. """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """ Return the entry for a key, fresh or stale, or None. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif self._shelf is not None and key in self._shelf:
+                entry = self._shelf[key]
+                # Monotonic clocks don't survive a restart; rebase the entry's age from wall-clock time.
+                entry.stored_at = time.monotonic() - max(0.0, time.time() - entry.stored_at_wall)
+                self._remember(key, entry)
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.stored_at < self.ttl
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._remember(key, entry)
+            if self._shelf is not None:
+                self._shelf[key] = entry
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, url: str, descendants: bool = False) -> None:
+        """ Remove the entries for a URL with any query string or headers, and optionally every URL beneath it. """
+        def matches(key: str) -> bool:
+            key = key.rpartition('#')[0]
+            return key == url or key.startswith(f'{url}?') or (descendants and key.startswith(f'{url}/'))
+
+        with self._lock:
+            for key in [key for key in self._entries if matches(key)]:
+                del self._entries[key]
+            if self._shelf is not None:
+                for key in [key for key in self._shelf.keys() if matches(key)]:
+                    del self._shelf[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._shelf is not None:
+                self._shelf.clear()
+
+    def close(self) -> None:
+        """ Close the on-disk backend, if any. Entries held in memory are still served. """
+        with self._lock:
+            if self._shelf is not None:
+                self._shelf.close()
+                self._shelf = None
+
+
+class CachingAdapter(AdapterWrapper):
+    """ Serve GET requests from a ResponseCache, revalidating stale entries with conditional requests. """
+    layer = 30
+
+    def __init__(self, cache: ResponseCache, adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__(adapter=adapter)
+        self.cache = cache
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != 'GET' or kwargs.get('stream'):
+            return self.adapter.send(request, **kwargs)
+
+        key = cache_key(request)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.count('hits')
+            return self._build_response(request=request, entry=entry)
+
+        if entry is not None:
+            request.headers.update(entry.validators)
+
+        response = self.adapter.send(request, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            self.cache.count('revalidations')
+            response.close()
+            headers = dict(entry.headers)
+            headers.update((name, value) for name, value in response.headers.items()
+                           if name.lower() in ('etag', 'last-modified', 'date', 'cache-control'))
+            revalidated = CacheEntry(status_code=entry.status_code, reason=entry.reason, headers=headers,
+                                     content=entry.content)
+            self.cache.put(key=key, entry=revalidated)
+            return self._build_response(request=request, entry=revalidated)
+
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.put(key=key, entry=CacheEntry(status_code=response.status_code, reason=response.reason,
+                                                     headers=dict(response.headers), content=response.content))
+        return response
+
+    def close(self) -> None:
+        self.cache.close()
+        super().close()
+
+    def _build_response(self, request: requests.PreparedRequest, entry: CacheEntry) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response.reason = entry.reason
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry.content
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(0)
+        return response
@@ -0,0 +1,132 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Single-flight coalescing of identical concurrent GET requests. """
+
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import asyncio
+import threading
+
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+import requests
+
+from management_api_tools.utils.adapters import AdapterWrapper, read_body
+
+
+def request_key(method: str, url: str, params: Optional[Mapping[str, Any]] = None) -> str:
+    """
+    Identify a request by method, URL, and query parameters, independent of parameter order.
+    `params` are merged into the query the way requests and the asyncio client send them: None values are dropped.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query.extend((name, str(value)) for name, value in (params or {}).items() if value is not None)
+    return f'{method.upper()} {urlunsplit(parts._replace(query=urlencode(sorted(query)), fragment=""))}'
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time. Callers that arrive while a call is in flight wait for it and share its
+    result or exception, instead of starting their own.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, Future] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        """ Return how many calls were made, and how many callers shared another caller's call. """
+        with self._lock:
+            return {'requests': self._counts['requests'], 'coalesced': self._counts['coalesced']}
+
+    def do(self, key: str, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """ Return the result of `function()`, or of the call in flight for `key`, and whether it was shared. """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            self._counts['requests' if leader else 'coalesced'] += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as error:
+            self._finish(key)
+            future.set_exception(error)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def _finish(self, key: str) -> None:
+        # Forget the call before publishing its outcome, so later callers start a fresh request.
+        with self._lock:
+            del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    The asyncio counterpart of SingleFlight. The shared call runs as its own task, so cancelling the caller that
+    started it does not cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._counts: Counter = Counter()
+
+    def stats(self) -> Dict[str, int]:
+        """ Return how many calls were made, and how many callers shared another caller's call. """
+        return {'requests': self._counts['requests'], 'coalesced': self._counts['coalesced']}
+
+    async def do(self, key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+        """ Return the result of `await function()`, or of the call already in flight for `key`. """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self._counts['requests'] += 1
+        else:
+            self._counts['coalesced'] += 1
+        return await asyncio.shield(task)
+
+
+class CoalescingAdapter(AdapterWrapper):
+    """
+    Share one request among identical GETs in flight at the same time. Each caller receives its own response
+    object over the same body. Streamed and conditional requests are always sent on their own.
+    """
+    layer = 40
+
+    def __init__(self, flights: SingleFlight, adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__(adapter=adapter)
+        self.flights = flights
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        conditional = 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+        if request.method != 'GET' or kwargs.get('stream') or conditional:
+            return self.adapter.send(request, **kwargs)
+
+        def send() -> requests.Response:
+            return read_body(self.adapter.send(request, **kwargs), stream=False)
+
+        response, shared = self.flights.do(key=request_key(method=request.method, url=request.url), function=send)
+        return self._copy_response(request=request, response=response) if shared else response
+
+    def _copy_response(self, request: requests.PreparedRequest, response: requests.Response) -> requests.Response:
+        copy = requests.Response()
+        copy.status_code = response.status_code
+        copy.reason = response.reason
+        copy.headers = CaseInsensitiveDict(response.headers)
+        copy.encoding = response.encoding
+        copy._content = response.content
+        copy.url = response.url
+        copy.request = request
+        copy.connection = self
+        copy.elapsed = response.elapsed
+        return copy
@@ -0,0 +1,67 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Run API calls concurrently on a bounded thread pool. """
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+
+@dataclass
+class BatchResult:
+    """ The outcome of one call within a concurrent batch. Failures are captured rather than raised. """
+    item: Any
+    response: Any = None
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        """ True if the call raised no exception and the response, if it has a status, is successful. """
+        return self.error is None and getattr(self.response, 'ok', True)
+
+
+def _result(future: Future, item: Any) -> BatchResult:
+    try:
+        return BatchResult(item=item, response=future.result())
+    except Exception as error:
+        return BatchResult(item=item, error=error)
+
+
+def map_concurrently(function: Callable[[Any], Any], items: Iterable[Any], max_workers: int,
+                     ordered: bool = False, window: Optional[int] = None) -> Iterator[BatchResult]:
+    """
+    Call `function` once per item on up to `max_workers` threads.
+    Results are yielded as they finish, or in input order if `ordered` is True. An exception raised for one item is
+    reported on its BatchResult and does not abort the rest of the batch. Items are drawn from `items` lazily, with at
+    most `window` calls (default: four per worker) submitted but not yet yielded, so large inputs are never held in
+    memory at once.
+    """
+    window = window or max_workers * 4
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    queue: 'deque[Future]' = deque()
+    futures: Dict[Future, Any] = {}
+
+    def drain(until: int) -> Iterator[BatchResult]:
+        while len(futures) > until:
+            if ordered:
+                done = [queue.popleft()]
+                wait(done)
+            else:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _result(future, futures.pop(future))
+
+    try:
+        for item in items:
+            future = executor.submit(function, item)
+            futures[future] = item
+            if ordered:
+                queue.append(future)
+            yield from drain(until=window - 1)
+        yield from drain(until=0)
+    finally:
+        # The caller may stop iterating early; don't start calls nobody will read.
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
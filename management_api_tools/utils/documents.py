@@ -0,0 +1,38 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Normalize and fingerprint data policy documents. """
+
+from typing import Any, List, Mapping
+import hashlib
+import json
+
+# The documented fields of a data policy. Policies may carry others, which are kept and compared like these.
+POLICY_FIELDS = ('status', 'enabled', 'policyId', 'description', 'ruleCombiningAlgId', 'rules')
+# Fields the server assigns, which are ignored when comparing policies.
+SERVER_FIELDS = ('id',)
+
+
+def load_policies(policy_document: str) -> List[dict]:
+    """ Parse a policy document containing either a single policy or a list of policies. """
+    policies = json.loads(policy_document)
+    return policies if isinstance(policies, list) else [policies]
+
+
+def normalize_policy(policy: Mapping[str, Any]) -> dict:
+    """ Return a policy without its server-assigned fields, so live and desired policies compare equal. """
+    return {field: value for field, value in policy.items() if field not in SERVER_FIELDS}
+
+
+def dump_policy(policy: Mapping[str, Any]) -> str:
+    """ Serialize a normalized policy deterministically, for comparison. """
+    return json.dumps(normalize_policy(policy), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def serialize_policy(policy: Mapping[str, Any]) -> str:
+    """ Serialize a policy to send as given, every field included. """
+    return json.dumps(policy, separators=(',', ':'), ensure_ascii=False)
+
+
+def policy_hash(policy: Mapping[str, Any]) -> str:
+    """ Return a content hash of a policy, independent of key order and server-managed fields. """
+    return hashlib.sha256(dump_policy(policy).encode()).hexdigest()
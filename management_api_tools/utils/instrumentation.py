@@ -0,0 +1,216 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Per-endpoint request counters and latency histograms for `MachinaLogin.api_session`. """
+
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+import socket
+import threading
+import time
+
+from requests.adapters import BaseAdapter
+import requests
+
+from management_api_tools.utils.adapters import AdapterWrapper
+
+# Upper bounds, in seconds, of the latency histogram buckets. The last bucket is unbounded.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# signing: HmacAuth; server: send until response headers, including connection setup when a new connection is opened;
+# download: reading the body. requests does not expose DNS, connect, and TLS times separately.
+PHASES = ('signing', 'server', 'download', 'total')
+RESOURCES = ('policies', 'metrics')
+
+
+class Histogram:
+    """ Cumulative-friendly latency histogram over fixed bucket bounds. Not thread-safe; RequestStats locks it. """
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, quantile: float) -> float:
+        """ Estimate a quantile as the upper bound of the bucket that contains it. """
+        rank, seen = quantile * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(count=self.count, sum=self.sum, buckets=list(zip(LATENCY_BUCKETS + (float('inf'),), self.counts)),
+                    p50=self.quantile(0.5), p99=self.quantile(0.99))
+
+
+@dataclass
+class EndpointStats:
+    """ Counters and per-phase latency histograms for one endpoint. """
+    requests: int = 0
+    errors: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    status_codes: Counter = field(default_factory=Counter)
+    latency: Dict[str, Histogram] = field(default_factory=lambda: {phase: Histogram() for phase in PHASES})
+
+
+@dataclass
+class RequestEvent:
+    """ One request attempt, as passed to sinks. `phases` maps phase names to seconds. """
+    endpoint: str
+    status_code: Optional[int]
+    bytes_sent: int
+    bytes_received: int
+    phases: Dict[str, float]
+    error: Optional[BaseException] = None
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """ Name an endpoint by method and path template, e.g. 'GET /policies/{id}', so ids don't split the stats. """
+    segments = urlsplit(url).path.split('/')
+    for index, segment in enumerate(segments):
+        if segment in RESOURCES:
+            template = '/'.join([segment] + ['{id}' if part else '' for part in segments[index + 1:]])
+            return f'{method} /{template}'
+    return f'{method} {urlsplit(url).path}'
+
+
+class RequestStats:
+    """
+    Thread-safe per-endpoint counters and latency histograms, with pluggable sinks.
+    Each sink is called with a RequestEvent after every request attempt; sinks should be fast and must not raise.
+    """
+
+    def __init__(self) -> None:
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.sinks: List[Callable[[RequestEvent], None]] = []
+        self._lock = threading.Lock()
+        self._signing = threading.local()
+
+    def add_sink(self, sink: Callable[[RequestEvent], None]) -> None:
+        self.sinks.append(sink)
+
+    def observe_signing(self, seconds: float) -> None:
+        """ Remember the signing time of the request being prepared on this thread, until it is sent. """
+        self._signing.seconds = seconds
+
+    def record(self, event: RequestEvent) -> None:
+        with self._lock:
+            stats = self.endpoints.get(event.endpoint)
+            if stats is None:
+                stats = self.endpoints[event.endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.bytes_sent += event.bytes_sent
+            stats.bytes_received += event.bytes_received
+            if event.error is not None:
+                stats.errors += 1
+            else:
+                stats.status_codes[event.status_code] += 1
+            for phase, seconds in event.phases.items():
+                stats.latency[phase].observe(seconds)
+        for sink in self.sinks:
+            sink(event)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """ Return a copy of the stats per endpoint, with histogram bucket counts and p50/p99 estimates. """
+        with self._lock:
+            return {endpoint: dict(requests=stats.requests, errors=stats.errors, bytes_sent=stats.bytes_sent,
+                                   bytes_received=stats.bytes_received, status_codes=dict(stats.status_codes),
+                                   latency={phase: histogram.snapshot() for phase, histogram in stats.latency.items()
+                                            if histogram.count})
+                    for endpoint, stats in self.endpoints.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints.clear()
+
+
+class InstrumentingAdapter(AdapterWrapper):
+    """ Record every request attempt next to the connection pool, so retries are counted as separate attempts. """
+    layer = 1
+
+    def __init__(self, stats: RequestStats, adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__(adapter=adapter)
+        self.stats = stats
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        signing = getattr(self.stats._signing, 'seconds', None)
+        self.stats._signing.seconds = None
+        body = request.body or b''
+        body_size = len(body.encode()) if isinstance(body, str) else len(body) if isinstance(body, bytes) else 0
+        phases: Dict[str, float] = {} if signing is None else {'signing': signing}
+        event = RequestEvent(endpoint=endpoint_name(request.method, request.url), status_code=None,
+                             bytes_sent=body_size, bytes_received=0, phases=phases)
+
+        started = time.perf_counter()
+        try:
+            response = self.adapter.send(request, **kwargs)
+            headers_received = time.perf_counter()
+            if kwargs.get('stream'):
+                event.bytes_received = int(response.headers.get('Content-Length') or 0)
+            else:
+                event.bytes_received = len(response.content)
+            finished = time.perf_counter()
+        except Exception as error:
+            event.error = error
+            phases['total'] = time.perf_counter() - started
+            self.stats.record(event)
+            raise
+
+        event.status_code = response.status_code
+        phases.update(server=headers_received - started, download=finished - headers_received,
+                      total=finished - started)
+        self.stats.record(event)
+        return response
+
+
+class StatsDSink:
+    """ Send each request to a StatsD server over UDP: a counter per status code, and a timer per phase. """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'machina') -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, event: RequestEvent) -> None:
+        name = event.endpoint.replace(' /', '.').replace('/', '.').replace('{id}', 'id').strip('.')
+        status = 'error' if event.error is not None else event.status_code
+        lines = [f'{self.prefix}.{name}.status.{status}:1|c',
+                 f'{self.prefix}.{name}.bytes_sent:{event.bytes_sent}|c',
+                 f'{self.prefix}.{name}.bytes_received:{event.bytes_received}|c']
+        lines.extend(f'{self.prefix}.{name}.{phase}:{seconds * 1000:.3f}|ms' for phase, seconds in event.phases.items())
+        try:
+            self._socket.sendto('\n'.join(lines).encode(), self.address)
+        except OSError:
+            pass
+
+
+def prometheus_exposition(snapshot: Dict[str, Dict[str, Any]], prefix: str = 'machina') -> str:
+    """ Render `RequestStats.snapshot()` in the Prometheus text exposition format. """
+    lines: List[str] = [f'# TYPE {prefix}_requests_total counter', f'# TYPE {prefix}_bytes_total counter',
+                        f'# TYPE {prefix}_request_seconds histogram']
+    for endpoint, stats in sorted(snapshot.items()):
+        label = f'endpoint="{endpoint}"'
+        for status_code, count in sorted(stats['status_codes'].items()):
+            lines.append(f'{prefix}_requests_total{{{label},status="{status_code}"}} {count}')
+        lines.append(f'{prefix}_requests_total{{{label},status="error"}} {stats["errors"]}')
+        lines.append(f'{prefix}_bytes_total{{{label},direction="sent"}} {stats["bytes_sent"]}')
+        lines.append(f'{prefix}_bytes_total{{{label},direction="received"}} {stats["bytes_received"]}')
+        for phase, histogram in stats['latency'].items():
+            cumulative = 0
+            for bound, count in histogram['buckets']:
+                cumulative += count
+                upper = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{prefix}_request_seconds_bucket{{{label},phase="{phase}",le="{upper}"}} {cumulative}')
+            lines.append(f'{prefix}_request_seconds_sum{{{label},phase="{phase}"}} {histogram["sum"]}')
+            lines.append(f'{prefix}_request_seconds_count{{{label},phase="{phase}"}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,193 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" A write-ahead journal for bulk policy operations, so an interrupted job resumes where it stopped. """
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import os
+import time
+
+from management_api_tools.utils.concurrency import BatchResult, map_concurrently
+from management_api_tools.utils.reconcile import CREATE, DELETE, PolicyOperation
+
+
+@dataclass
+class Progress:
+    """ Progress of a journaled job. `skipped` operations had finished in an earlier run. """
+    total: int
+    skipped: int = 0
+    finished: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic, repr=False)
+
+    @property
+    def remaining(self) -> int:
+        return self.total - self.skipped - self.finished - self.failed
+
+    @property
+    def rate(self) -> float:
+        """ Operations completed per second in this run. """
+        elapsed = time.monotonic() - self.started
+        return (self.finished + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """ Estimated seconds until every operation has completed, or None before the first completes. """
+        return self.remaining / self.rate if self.rate else None
+
+    def __str__(self) -> str:
+        done = self.skipped + self.finished + self.failed
+        eta = f'{self.eta:.0f}s' if self.eta is not None else '?'
+        return f'{done}/{self.total} operations ({self.failed} failed), {self.rate:.1f}/s, ETA {eta}'
+
+
+def is_finished(operation: PolicyOperation, result: BatchResult) -> bool:
+    """
+    True if an operation reached its goal. A delete that finds the policy already gone has, and so has a create
+    rejected as a conflict, which means an earlier attempt created the policy.
+    """
+    status_code = getattr(result.response, 'status_code', None)
+    if result.ok:
+        return True
+    return result.error is None and (operation.action, status_code) in ((DELETE, 404), (CREATE, 409))
+
+
+def unfinished(operations: Dict[int, PolicyOperation], outcomes: Dict[int, dict]) -> List[Tuple[int, PolicyOperation]]:
+    """ Return the operations whose latest outcome is missing or unfinished, in plan order. """
+    return [(seq, operation) for seq, operation in sorted(operations.items())
+            if not outcomes.get(seq, {}).get('finished')]
+
+
+class OperationJournal:
+    """
+    An append-only log of planned operations and their outcomes, one JSON record per line.
+    Planned operations are synced to disk before any is applied. Outcomes are synced in batches, every `sync_every`
+    records or `sync_interval` seconds, so a crash loses at most the latest batch of outcomes, and those operations
+    are applied again on resume, except for creates of policies that already exist (see `run_journaled`).
+    """
+
+    def __init__(self, path: Union[str, Path], sync_every: int = 100, sync_interval: float = 1.0) -> None:
+        self.path = Path(path).expanduser()
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def __enter__(self) -> 'OperationJournal':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def read(self) -> Tuple[Dict[int, PolicyOperation], Dict[int, dict]]:
+        """ Return the planned operations and the latest outcome of each, by sequence number. """
+        operations, outcomes = {}, {}
+        if not self.path.exists():
+            return operations, outcomes
+        with self.path.open(encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A write torn by a crash; the records around it are intact.
+                if 'operation' in record:
+                    operations[record['seq']] = PolicyOperation(**record['operation'])
+                else:
+                    outcomes[record['seq']] = record
+        return operations, outcomes
+
+    def pending(self) -> List[Tuple[int, PolicyOperation]]:
+        """ Return the planned operations without a finished outcome, in plan order. """
+        return unfinished(*self.read())
+
+    def plan(self, operations: Iterable[PolicyOperation]) -> int:
+        """ Record the operations of a new job and sync them to disk. Returns how many were planned. """
+        if self.path.exists() and self.path.stat().st_size:
+            raise FileExistsError(f'Journal already exists, resume it or remove it: {self.path}')
+        count = 0
+        for seq, operation in enumerate(operations):
+            self._append({'seq': seq, 'operation': asdict(operation)})
+            count = seq + 1
+        self.sync()
+        return count
+
+    def record(self, seq: int, result: BatchResult, finished: bool) -> None:
+        """ Record the outcome of an operation, syncing if a batch is due. """
+        record = {'seq': seq, 'finished': finished, 'status': getattr(result.response, 'status_code', None)}
+        if result.error is not None:
+            record['error'] = f'{type(result.error).__name__}: {result.error}'
+        self._append(record)
+        if self._unsynced >= self.sync_every or time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+
+    def _append(self, record: dict) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open('a+', encoding='utf-8')
+            # Terminate a line torn by a crash, so the first new record starts on its own line.
+            if self._file.tell() and not self._last_byte_is_newline():
+                self._file.write('\n')
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._unsynced += 1
+
+    def _last_byte_is_newline(self) -> bool:
+        with self.path.open('rb') as file:
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def sync(self) -> None:
+        """ Flush buffered records and fsync them. """
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced, self._synced_at = 0, time.monotonic()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+def run_journaled(apply: Callable[[PolicyOperation], Any], journal: OperationJournal, max_workers: int = 8,
+                  progress: Optional[Callable[[Progress], None]] = None, progress_interval: float = 1.0,
+                  existing: Optional[Callable[[], Collection[str]]] = None) -> List[BatchResult]:
+    """
+    Apply the pending operations of a journal concurrently, recording each outcome as it completes.
+    A create whose outcome was lost may have succeeded, so if any create is pending, `existing` is called once for
+    the policyIds that exist now, and pending creates of those are recorded as finished instead of sent again.
+    `progress` is called with a Progress at most every `progress_interval` seconds, and once at the end.
+    Returns a BatchResult per operation applied in this run.
+    """
+    operations, outcomes = journal.read()
+    pending = unfinished(operations, outcomes)
+    reported_at, results = time.monotonic(), []
+
+    with journal:
+        if existing is not None and any(operation.action == CREATE for _, operation in pending):
+            policy_ids = set(existing())
+            for seq, operation in pending:
+                if operation.action == CREATE and operation.policy_id in policy_ids:
+                    journal.record(seq=seq, result=BatchResult(item=operation), finished=True)
+            pending = [(seq, operation) for seq, operation in pending
+                       if operation.action != CREATE or operation.policy_id not in policy_ids]
+        status = Progress(total=len(operations), skipped=len(operations) - len(pending))
+
+        for result in map_concurrently(lambda item: apply(item[1]), pending, max_workers=max_workers):
+            seq, operation = result.item
+            finished = is_finished(operation, result)
+            journal.record(seq=seq, result=result, finished=finished)
+            status.finished += finished
+            status.failed += not finished
+            results.append(BatchResult(item=operation, response=result.response, error=result.error))
+
+            if progress is not None and time.monotonic() - reported_at >= progress_interval:
+                progress(status)
+                reported_at = time.monotonic()
+
+    if progress is not None:
+        progress(status)
+    return results
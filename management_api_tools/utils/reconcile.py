@@ -0,0 +1,97 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Plan the changes required to move live data policies to a desired state. """
+
+from dataclasses import dataclass, field
+from typing import Iterable, List, Mapping, Optional, Union
+
+from management_api_tools.models import Policy
+from management_api_tools.utils.documents import policy_hash, serialize_policy
+
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+
+@dataclass(frozen=True)
+class PolicyOperation:
+    """ A single create, update, or delete of a data policy. """
+    action: str
+    policy_id: str
+    policy_identifier: Optional[str] = None
+    policy_document: Optional[str] = None
+
+
+@dataclass
+class PolicyPlan:
+    """ The operations required to reach the desired state, and the policyIds that already match it. """
+    operations: List[PolicyOperation] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.operations)
+
+    def _select(self, action: str) -> List[PolicyOperation]:
+        return [operation for operation in self.operations if operation.action == action]
+
+    @property
+    def creates(self) -> List[PolicyOperation]:
+        return self._select(CREATE)
+
+    @property
+    def updates(self) -> List[PolicyOperation]:
+        return self._select(UPDATE)
+
+    @property
+    def deletes(self) -> List[PolicyOperation]:
+        return self._select(DELETE)
+
+
+def _hash(policy: Union[Mapping, Policy]) -> str:
+    return policy.digest if isinstance(policy, Policy) else policy_hash(policy)
+
+
+def _dump(policy: Union[Mapping, Policy]) -> str:
+    return policy.to_json() if isinstance(policy, Policy) else serialize_policy(policy)
+
+
+def plan_policies(desired: Iterable[Union[Mapping, Policy]], live: Iterable[Union[Mapping, Policy]],
+                  delete: bool = False) -> PolicyPlan:
+    """
+    Compare desired and live policies by policyId and content hash. Either may be policy dicts or Policy models.
+    Live policies missing from the desired state are deleted only if `delete` is True, which mirrors merge='replace'.
+    Live policies that share a policyId with an earlier live policy are treated as missing from the desired state,
+    and only the first desired policy with a given policyId is considered.
+    """
+    live_index, duplicates = {}, []
+    for policy in live:
+        if policy['policyId'] in live_index:
+            duplicates.append(policy)
+        else:
+            live_index[policy['policyId']] = (policy['id'], _hash(policy))
+
+    plan, seen = PolicyPlan(), set()
+    for policy in desired:
+        policy_id = policy['policyId']
+        if policy_id in seen:
+            continue
+        seen.add(policy_id)
+
+        if policy_id not in live_index:
+            plan.operations.append(PolicyOperation(action=CREATE, policy_id=policy_id,
+                                                   policy_document=_dump(policy)))
+            continue
+
+        policy_identifier, live_hash = live_index.pop(policy_id)
+        if _hash(policy) == live_hash:
+            plan.unchanged.append(policy_id)
+        else:
+            plan.operations.append(PolicyOperation(action=UPDATE, policy_id=policy_id,
+                                                   policy_identifier=policy_identifier,
+                                                   policy_document=_dump(policy)))
+
+    if delete:
+        extras = [(policy_id, policy_identifier) for policy_id, (policy_identifier, _) in live_index.items()]
+        extras.extend((policy['policyId'], policy['id']) for policy in duplicates)
+        plan.operations.extend(PolicyOperation(action=DELETE, policy_id=policy_id, policy_identifier=policy_identifier)
+                               for policy_id, policy_identifier in extras)
+
+    return plan
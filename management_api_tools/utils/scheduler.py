@@ -0,0 +1,172 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Rate-limit-aware retries and adaptive concurrency for `MachinaLogin.api_session`. """
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import random
+import threading
+import time
+
+from requests.adapters import BaseAdapter
+from requests.auth import AuthBase
+import requests
+
+from management_api_tools.utils.adapters import AdapterWrapper, read_body
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+PUSHBACK_STATUSES = frozenset({429, 503})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class AdaptiveLimiter:
+    """
+    Bound the number of requests in flight, adapting the bound AIMD style: each success raises the limit by roughly
+    one request per round of `limit` requests, and pushback from the server multiplies it by `decrease`.
+    The requests in flight when the server pushes back were sent under the old limit, so their pushback is the same
+    congestion event: only pushback on a request acquired after the last decrease decreases the limit again.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64, decrease: float = 0.5) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.decreases = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> int:
+        """ Wait for a slot. Returns the number of decreases so far, to pass back to `release`. """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            return self.decreases
+
+    def release(self, pushback: bool = False, acquired: Optional[int] = None) -> None:
+        """ Free a slot taken by `acquire`, which returned `acquired`, adapting the limit to the outcome. """
+        with self._condition:
+            self.in_flight -= 1
+            if pushback:
+                if acquired is None or acquired == self.decreases:
+                    self.limit = max(float(self.minimum), self.limit * self.decrease)
+                    self.decreases += 1
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    Shared retry and concurrency policy for every request sent through a session.
+    Idempotent requests are retried on connection errors, timeouts, and `RETRY_STATUSES`; any request is retried on
+    429, since the server did not process it. Retry-After is honoured, otherwise the delay is a jittered exponential
+    backoff.
+    """
+
+    def __init__(self, retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0,
+                 initial_concurrency: int = 8, max_concurrency: int = 64, min_concurrency: int = 1) -> None:
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = AdaptiveLimiter(initial=initial_concurrency, minimum=min_concurrency, maximum=max_concurrency)
+        self.requests = 0
+        self.retried = 0
+        self.pushbacks = 0
+        self.queued_seconds = 0.0
+        self.backoff_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, float]:
+        """ Return request, retry, and pushback counters, seconds spent queued and backing off, and the limit. """
+        with self._lock:
+            return dict(requests=self.requests, retried=self.retried, pushbacks=self.pushbacks,
+                        queued_seconds=self.queued_seconds, backoff_seconds=self.backoff_seconds,
+                        concurrency_limit=self.limiter.limit, in_flight=self.limiter.in_flight)
+
+    def should_retry(self, method: str, status_code: Optional[int], attempt: int) -> bool:
+        """ Decide whether to retry after a status code, or after a connection error or timeout if it is None. """
+        if attempt >= self.retries:
+            return False
+        if status_code == 429:
+            return True
+        return method in IDEMPOTENT_METHODS and (status_code is None or status_code in RETRY_STATUSES)
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """ Seconds to wait before the next attempt. """
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        # Full jitter spreads the retries of many threads hitting the same limit.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def count(self, counter: str, amount: float = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """ Parse a Retry-After header given in seconds or as an HTTP date. """
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class SchedulingAdapter(AdapterWrapper):
+    """
+    Send requests within the scheduler's concurrency limit, retrying and re-signing them as required.
+    Pushback statuses, connection errors, and timeouts all lower the limit.
+    """
+    layer = 10
+
+    def __init__(self, scheduler: RequestScheduler, session: requests.Session,
+                 adapter: Optional[BaseAdapter] = None) -> None:
+        super().__init__(adapter=adapter)
+        self.scheduler = scheduler
+        self.session = session
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.scheduler.count('requests')
+            response, error, pushback = None, None, False
+            queued = time.perf_counter()
+            acquired = self.scheduler.limiter.acquire()
+            self.scheduler.count('queued_seconds', time.perf_counter() - queued)
+            try:
+                response = read_body(self.adapter.send(request, **kwargs), stream=kwargs.get('stream', False))
+                pushback = response.status_code in PUSHBACK_STATUSES
+            except (requests.ConnectionError, requests.Timeout) as request_error:
+                # A failing or overloaded server is no reason to send more at once: count it as pushback.
+                error, pushback = request_error, True
+            finally:
+                self.scheduler.limiter.release(pushback=pushback, acquired=acquired)
+
+            status_code = response.status_code if response is not None else None
+            if not self.scheduler.should_retry(method=request.method, status_code=status_code, attempt=attempt):
+                if error is not None:
+                    raise error
+                return response
+
+            if pushback:
+                self.scheduler.count('pushbacks')
+            self.scheduler.count('retried')
+            delay = self.scheduler.delay(attempt=attempt, response=response)
+            self.scheduler.count('backoff_seconds', delay)
+            time.sleep(delay)
+            if response is not None:
+                response.close()
+            if isinstance(self.session.auth, AuthBase):
+                # Signatures include the Date header, so sign again rather than replay a stale one.
+                self.session.auth(request)
+            attempt += 1
@@ -0,0 +1,282 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Incrementally decode the items of a JSON array from a response body, as its chunks arrive. """
+
+from json.decoder import scanstring
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple, Union
+import codecs
+import json
+import re
+
+import requests
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+WHITESPACE_CHARACTERS = ' \t\n\r'
+DELIMITERS = ' \t\n\r,]}'
+STRUCTURE = re.compile(r'["\[\]{}]')
+SCALAR_END = re.compile(r'[,\]} \t\n\r]')
+SCANNER = json.JSONDecoder().scan_once
+
+
+class _NeedMore(Exception):
+    """ The buffer ends before the current token does. """
+
+
+def _skip_whitespace(buffer: str, position: int) -> int:
+    return WHITESPACE.match(buffer, position).end()
+
+
+def _expect(buffer: str, position: int, character: str) -> int:
+    position = _skip_whitespace(buffer, position)
+    if position >= len(buffer):
+        raise _NeedMore
+    if buffer[position] != character:
+        raise ValueError(f'Expected {character!r} at offset {position}, found {buffer[position]!r}')
+    return position + 1
+
+
+def _string_end(buffer: str, position: int) -> Tuple[str, int]:
+    """ Decode the string starting after the quote at `position`. """
+    try:
+        return scanstring(buffer, position + 1)
+    except ValueError:
+        if _unterminated(buffer, position):
+            raise _NeedMore
+        raise
+
+
+def _unterminated(buffer: str, position: int) -> bool:
+    """ True if the string at `position` has no closing quote yet, counting escapes. """
+    index = position + 1
+    while index < len(buffer):
+        if buffer[index] == '\\':
+            index += 2
+            continue
+        if buffer[index] == '"':
+            return False
+        index += 1
+    return True
+
+
+def _value_end(buffer: str, position: int) -> int:
+    """ Return the offset just past the JSON value at `position`, without decoding it. """
+    position = _skip_whitespace(buffer, position)
+    if position >= len(buffer):
+        raise _NeedMore
+    first = buffer[position]
+    if first == '"':
+        return _string_end(buffer, position)[1]
+    if first not in '[{':
+        match = SCALAR_END.search(buffer, position)
+        if match is None:
+            raise _NeedMore
+        return match.start()
+
+    depth = 0
+    while True:
+        match = STRUCTURE.search(buffer, position)
+        if match is None:
+            raise _NeedMore
+        character, position = match.group(), match.start()
+        if character == '"':
+            position = _string_end(buffer, position)[1]
+            continue
+        depth += 1 if character in '[{' else -1
+        position += 1
+        if depth == 0:
+            return position
+
+
+def _project(buffer: str, position: int, fields: frozenset) -> Tuple[dict, int]:
+    """ Decode only `fields` of the object at `position`, skipping the other values without decoding them. """
+    position = _expect(buffer, position, '{')
+    item = {}
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position >= len(buffer):
+            raise _NeedMore
+        if buffer[position] == '}':
+            return item, position + 1
+        if buffer[position] == ',':
+            position += 1
+            continue
+        key, position = _string_end(buffer, _expect(buffer, position, '"') - 1)
+        position = _expect(buffer, position, ':')
+        end = _value_end(buffer, position)
+        if key in fields:
+            item[key] = json.loads(buffer[position:end])
+        position = end
+
+
+def iter_members(text: str) -> Iterator[Tuple[str, str]]:
+    """ Yield the key and raw JSON text of each member of a complete JSON object, without decoding the values. """
+    try:
+        position = _expect(text, 0, '{')
+        while True:
+            position = _skip_whitespace(text, position)
+            if text[position:position + 1] == '}':
+                return
+            if text[position:position + 1] == ',':
+                position += 1
+                continue
+            key, position = _string_end(text, _expect(text, position, '"') - 1)
+            start = _skip_whitespace(text, _expect(text, position, ':'))
+            position = _value_end(text, start)
+            yield key, text[start:position]
+    except _NeedMore:
+        raise ValueError('Truncated JSON object') from None
+
+
+class _Buffer:
+    """
+    Decoded text of a body read chunk by chunk. Consumed text is only dropped when the next chunk is appended, so
+    reading an item never copies the rest of the buffer.
+    """
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]) -> None:
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.position = 0
+        self.exhausted = False
+
+    def _next_text(self) -> Optional[str]:
+        """ Return the next non-empty piece of text, or None at the end of the body. """
+        while not self.exhausted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                text = self.decoder.decode(b'', final=True)
+            else:
+                text = self.decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                return text
+        return None
+
+    def fill(self) -> None:
+        """ Append the next piece of text, compacting away the consumed text. Raises ValueError at the end. """
+        text = self._next_text()
+        if text is None:
+            raise ValueError('Truncated JSON')
+        self.text, self.position = self.text[self.position:] + text, 0
+
+    def peek(self) -> str:
+        """ Skip whitespace and return the next character, or '' at the end of the body. """
+        if self.position < len(self.text) and self.text[self.position] not in WHITESPACE_CHARACTERS:
+            return self.text[self.position]
+        while True:
+            self.position = _skip_whitespace(self.text, self.position)
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if self.exhausted:
+                return ''
+            self.fill()
+
+    def expect(self, character: str) -> None:
+        found = self.peek()
+        if found != character:
+            raise ValueError(f'Expected {character!r}, found {found or "the end of the body"!r}')
+        self.position += 1
+
+    def key(self) -> str:
+        """ Decode the object key at the current position, and the colon after it. """
+        self.expect('"')
+        while True:
+            try:
+                name, self.position = scanstring(self.text, self.position)
+                break
+            except ValueError:
+                # After a fill the key's text starts the buffer, and its quote sits just before it.
+                if not _unterminated(self.text, self.position - 1):
+                    raise
+                self.fill()
+        self.expect(':')
+        return name
+
+    def value(self, decode: Callable[[str], Any]) -> Any:
+        """
+        Decode the value at the current position with the C scanner, in place. A value that continues past the buffer
+        is retried only each time its buffered text has doubled, so it is scanned about twice in all, however many
+        chunks it spans.
+        """
+        self.peek()
+        pending, pending_size, attempted = [], 0, 0
+        while True:
+            if pending:
+                self.text, self.position = self.text[self.position:] + ''.join(pending), 0
+                pending, pending_size = [], 0
+            try:
+                value, end = SCANNER(self.text, self.position)
+            except (ValueError, StopIteration):
+                if self.exhausted:
+                    raise ValueError('Truncated or invalid JSON') from None
+            else:
+                # A number cut by the end of a chunk decodes too; the value is only whole once a delimiter follows it.
+                if self.exhausted or (end < len(self.text) and self.text[end] in DELIMITERS):
+                    start, self.position = self.position, end
+                    return value if decode is json.loads else decode(self.text[start:end])
+            attempted = len(self.text) - self.position
+            while pending_size < attempted or not pending:
+                text = self._next_text()
+                if text is None:
+                    break
+                pending.append(text)
+                pending_size += len(text)
+
+
+def iter_json_array(chunks: Iterable[Union[bytes, str]], key: str, fields: Optional[Sequence[str]] = None,
+                    decode: Callable[[str], Any] = json.loads) -> Iterator[Any]:
+    """
+    Yield the items of the array under the top-level `key` of a JSON object, decoding each item as soon as it has
+    arrived. If `fields` is given, items must be objects, and only those keys are kept; otherwise each item is
+    decoded by passing its raw JSON text to `decode`. Memory is bounded by the largest single item, not the whole
+    body, and an item split across many chunks is scanned about twice rather than once per chunk.
+    """
+    buffer = _Buffer(chunks)
+    try:
+        buffer.expect('{')
+        while True:
+            character = buffer.peek()
+            if character == ',':
+                buffer.position += 1
+                continue
+            if character == '}':
+                return
+            if buffer.key() == key:
+                break
+            buffer.value(decode=json.loads)
+
+        buffer.expect('[')
+        while True:
+            character = buffer.peek()
+            if character == ']':
+                return
+            if character == ',':
+                buffer.position += 1
+                continue
+            if not character:
+                raise ValueError('Truncated JSON')
+            item = buffer.value(decode=decode if fields is None else json.loads)
+            if fields is not None:
+                item = {name: item[name] for name in fields if name in item}
+            yield item
+    except ValueError as error:
+        raise ValueError(f'{error} while reading {key!r}') from error
+
+
+def stream_items(response: requests.Response, key: str, fields: Optional[Sequence[str]] = None,
+                 decode: Callable[[str], Any] = json.loads, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    Return an iterator over the array under `key` of a response requested with stream=True. The status is checked
+    now, raising requests.HTTPError; the body is read as the iterator is consumed, and the connection is released
+    once it is exhausted or closed.
+    """
+    if not response.ok:
+        response.close()
+        response.raise_for_status()
+
+    def items() -> Iterator[Any]:
+        with response:
+            chunks = response.iter_content(chunk_size=chunk_size)
+            yield from iter_json_array(chunks, key=key, fields=fields, decode=decode)
+    return items()
@@ -0,0 +1,52 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Split large policy documents into batches for concurrent upload. """
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Mapping, Optional
+
+from management_api_tools.utils.concurrency import BatchResult
+from management_api_tools.utils.documents import serialize_policy
+
+
+@dataclass
+class UploadSummary:
+    """
+    The outcome of a batched upload: the number of policies in each batch, a BatchResult per batch and per deletion,
+    and the `Resources` of every successful batch response merged into one list.
+    """
+    batch_sizes: List[int] = field(default_factory=list)
+    batches: List[BatchResult] = field(default_factory=list)
+    deletions: List[BatchResult] = field(default_factory=list)
+    resources: List[Any] = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return all(result.ok for result in self.batches + self.deletions)
+
+
+def split_policies(policies: Iterable[Mapping], batch_size: Optional[int] = 500,
+                   max_bytes: Optional[int] = None) -> List[List[str]]:
+    """
+    Split policies into batches of serialized policies, each at most `batch_size` policies and, once joined by
+    `batch_document`, `max_bytes` UTF-8 bytes. A single policy larger than `max_bytes` is placed in a batch of its own.
+    """
+    batches, batch, batch_bytes = [], [], 2  # The enclosing brackets.
+    for policy in policies:
+        document = serialize_policy(policy)
+        size = len(document.encode()) + (1 if batch else 0)  # A separating comma.
+        full = batch_size is not None and len(batch) >= batch_size
+        if batch and (full or (max_bytes is not None and batch_bytes + size > max_bytes)):
+            batches.append(batch)
+            batch, batch_bytes, size = [], 2, size - 1
+        batch.append(document)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def batch_document(batch: List[str]) -> str:
+    """ Join serialized policies into a policy document. """
+    return f'[{",".join(batch)}]'
@@ -0,0 +1,185 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Watch data policies for changes with conditional, adaptively spaced polls, and fan the changes out. """
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import queue
+import threading
+
+from management_api_tools.utils.documents import policy_hash
+
+ADDED, MODIFIED, REMOVED = 'added', 'modified', 'removed'
+
+
+@dataclass(frozen=True)
+class PolicyChange:
+    """ One change to a data policy. `policy` is the new content, or None for a removal. """
+    kind: str
+    policy_identifier: str
+    policy_id: str
+    policy: Optional[dict] = None
+
+
+class Page(NamedTuple):
+    """ The answer to a conditional list request: a 304 has no resources, and keeps the previous ETag. """
+    not_modified: bool
+    etag: Optional[str]
+    resources: List[dict]
+    total_results: Optional[int]
+
+
+class Subscription:
+    """ An iterator over the changes published after it was created. Close it to unsubscribe. """
+
+    def __init__(self, watcher: 'PolicyWatcher') -> None:
+        self._watcher = watcher
+        self._queue: 'queue.Queue[Optional[PolicyChange]]' = queue.Queue()
+
+    def __iter__(self) -> Iterator[PolicyChange]:
+        while True:
+            change = self._queue.get()
+            if change is None:
+                return
+            yield change
+
+    def get(self, timeout: Optional[float] = None) -> Optional[PolicyChange]:
+        """ Return the next change, or None if none arrives within `timeout` seconds or the subscription closed. """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, change: Optional[PolicyChange]) -> None:
+        self._queue.put(change)
+
+    def close(self) -> None:
+        self._watcher.unsubscribe(self)
+        self._queue.put(None)
+
+
+class PolicyWatcher:
+    """
+    Poll the policy list and publish what was added, modified, or removed since the last poll to every subscriber.
+    Each page is requested with the ETag it had last time, so an unchanged page costs a bodiless 304; only pages that
+    changed are downloaded and fingerprinted. The interval drops to `min_interval` when a poll finds changes and grows
+    by `backoff` after each quiet poll, up to `max_interval`, so it follows how often the policies actually change.
+    Failed polls are kept in `last_error` and retried after `max_interval`.
+    """
+
+    def __init__(self, fetch_page: Callable[[int, int, Optional[str]], Page], page_size: int = 1000,
+                 min_interval: float = 1.0, max_interval: float = 60.0, backoff: float = 1.5) -> None:
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.last_error: Optional[BaseException] = None
+        self._index: Optional[Dict[str, Tuple[str, str]]] = None
+        self._pages: List[Tuple[Optional[str], List[str], Optional[int]]] = []
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._polling = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'PolicyWatcher':
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def subscribe(self) -> Subscription:
+        """ Return a new subscription to the changes found by later polls. """
+        subscription = Subscription(watcher=self)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def poll(self) -> List[PolicyChange]:
+        """
+        Poll once, publish the changes, and return them. The first poll records the baseline and reports nothing.
+        Raises the error of a failed request, leaving the last-seen state unchanged.
+        """
+        with self._polling:
+            changes = self._poll()
+        self._publish(changes)
+        return changes
+
+    def _poll(self) -> List[PolicyChange]:
+        previous = self._index or {}
+        index, pages, changes = {}, [], []
+        skip, page_number = 0, 0
+        while True:
+            etag, identifiers, total_results = (self._pages[page_number] if page_number < len(self._pages)
+                                                else (None, [], None))
+            page = self.fetch_page(skip, self.page_size, etag)
+            if page.not_modified:
+                index.update((identifier, previous[identifier]) for identifier in identifiers)
+            else:
+                etag, identifiers, total_results = page.etag, [], page.total_results
+                for policy in page.resources:
+                    fingerprint = (policy['policyId'], policy_hash(policy))
+                    index[policy['id']] = fingerprint
+                    identifiers.append(policy['id'])
+                    if self._index is not None and previous.get(policy['id']) != fingerprint:
+                        kind = MODIFIED if policy['id'] in previous else ADDED
+                        changes.append(PolicyChange(kind=kind, policy_identifier=policy['id'],
+                                                    policy_id=policy['policyId'], policy=policy))
+            pages.append((etag, identifiers, total_results))
+
+            skip, page_number = skip + len(identifiers), page_number + 1
+            if len(identifiers) < self.page_size or (total_results is not None and skip >= total_results):
+                break
+
+        if self._index is not None:
+            changes.extend(PolicyChange(kind=REMOVED, policy_identifier=identifier, policy_id=policy_id)
+                           for identifier, (policy_id, _) in previous.items() if identifier not in index)
+        self._index, self._pages = index, pages
+        return changes
+
+    def _publish(self, changes: List[PolicyChange]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for change in changes:
+            for subscription in subscribers:
+                subscription.put(change)
+
+    def _next_interval(self, changed: bool) -> float:
+        if changed:
+            return self.min_interval
+        return min(self.max_interval, self.interval * self.backoff)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                changes = self.poll()
+            except Exception as error:
+                self.last_error, self.interval = error, self.max_interval
+            else:
+                self.last_error, self.interval = None, self._next_interval(changed=bool(changes))
+
+    def start(self) -> 'PolicyWatcher':
+        """ Poll on a background thread, starting after the current interval, until `stop()` is called. """
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='PolicyWatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """ Stop polling, and end the iteration of every subscription. """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscription in subscribers:
+            subscription.put(None)
@@ -6,12 +6,15 @@ from pathlib import Path
 import pytest
 
 from management_api_tools import Machina
+from management_api_tools.testing import FakeMachina
 from parserconfig import ParserConfig
 
 CONFIGURATION_FILE = Path.home().joinpath('.machina/settings.ini')
 
 BASIC, BEARER, HMAC = 'basic', 'bearer', 'hmac'
 
+FAKE_INSTANCE_ID, FAKE_IDENTITY, FAKE_SECRET = 'FAKE123', 'fake-identity', 'ZmFrZS1zZWNyZXQ='
+
 AUTHENTICATION = [
     pytest.param(BASIC, marks=pytest.mark.basic_authentication, id='basic_auth'),
     pytest.param(BEARER, marks=pytest.mark.bearer_authentication, id='bearer_auth'),
@@ -63,6 +66,27 @@ def init_machina(section) -> Machina:
     return machina
 
 
+def init_async_machina(section):
+    """ Return an authenticated AsyncMachina object for each environment. """
+    aio = pytest.importorskip('management_api_tools.aio')
+    instance_id = load_credentials('instance_id', section=section)
+    machina = aio.AsyncMachina(**instance_id)
+
+    if section == BASIC:
+        credentials = load_credentials('username', 'password', section=section)
+        machina.basic_authentication(**credentials)
+
+    if section == BEARER:
+        credentials = load_credentials('token', section=section)
+        machina.bearer_authentication(**credentials)
+
+    if section == HMAC:
+        credentials = load_credentials('identity', 'secret', section=section)
+        machina.hmac_authentication(**credentials)
+
+    return machina
+
+
 def init_policy_identifier(machina: Machina, section: str) -> str:
     """ Create a data policy to ensure the desired state exists, and use the policy identifier for subsequent tests. """
     # GIVEN a policy document
@@ -100,6 +124,12 @@ def authenticated_machina_instance(request) -> Machina:
     return init_machina(section=request.param)
 
 
+@pytest.fixture(params=AUTHENTICATION, name='AsyncMachina')
+def authenticated_async_machina_instance(request):
+    """ Return an authenticated AsyncMachina object for each authentication method. """
+    return init_async_machina(section=request.param)
+
+
 @pytest.fixture(params=AUTHENTICATION)
 def machina_resources(request) -> dict:
     """ This fixture provides a policy identifier to tests, then deletes the data policy upon completion. """
@@ -108,3 +138,14 @@ def machina_resources(request) -> dict:
 
     yield credentials
     delete_data_policy(machina=machina, policy_identifier=policy_identifier)
+
+
+@pytest.fixture
+def fake_machina() -> dict:
+    """ This fixture provides an HMAC authenticated Machina object backed by a local FakeMachina server. """
+    with FakeMachina(hmac_credentials={FAKE_IDENTITY: FAKE_SECRET}) as server:
+        machina = Machina(instance_id=FAKE_INSTANCE_ID, api_url=server.api_url)
+        machina.hmac_authentication(identity=FAKE_IDENTITY, secret=FAKE_SECRET)
+
+        yield dict(Machina=machina, server=server)
+        machina.api_session.close()
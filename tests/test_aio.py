@@ -0,0 +1,92 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Test the AsyncMachina implementation. """
+
+from datetime import datetime, timezone, timedelta
+import asyncio
+
+import pytest
+
+from conftest import FAKE_IDENTITY, FAKE_INSTANCE_ID, FAKE_SECRET
+
+aio = pytest.importorskip('management_api_tools.aio')
+
+
+def test_async_list_policies(AsyncMachina):
+    """ List policies test. """
+    # GIVEN an authenticated AsyncMachina instance
+    async def list_policies():
+        async with AsyncMachina:
+            return await AsyncMachina.list_policies()
+
+    # WHEN I make a request to an API endpoint
+    response = asyncio.run(list_policies())
+
+    # THEN the status code should be 200
+    assert response.status == 200, f'Failed: {response.reason}'
+
+
+def test_async_metrics(AsyncMachina):
+    """ Query the total users concurrently with listing policies. """
+    # GIVEN an authenticated AsyncMachina instance and valid parameters
+    end = datetime.now(timezone.utc)
+    start = end + timedelta(days=-1)
+    metric = {'start': f'{start.strftime("%Y%m%d-00:00")}', 'end': 'now', 'bucket': '1d', 'metric': 'total-users'}
+
+    async def gather():
+        async with AsyncMachina:
+            return await asyncio.gather(AsyncMachina.metrics(**metric), AsyncMachina.list_policies())
+
+    # WHEN I make concurrent requests to API endpoints
+    responses = asyncio.run(gather())
+
+    # THEN every status code should be 200
+    assert all(response.status == 200 for response in responses), f'Failed: {[r.reason for r in responses]}'
+
+
+def test_async_fetch_policy_coalesced(fake_machina):
+    """ Share one request among identical concurrent fetches from the asyncio client, offline. """
+    # GIVEN a slow fake server with an existing policy, and an AsyncMachina instance with coalescing enabled
+    server = fake_machina['server']
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=1)
+    server.latency = 0.2
+    policy_identifier = next(iter(server.policies[FAKE_INSTANCE_ID]))
+    machina = aio.AsyncMachina(instance_id=FAKE_INSTANCE_ID, api_url=server.api_url)
+    machina.hmac_authentication(identity=FAKE_IDENTITY, secret=FAKE_SECRET)
+    single_flight = machina.enable_coalescing()
+
+    async def gather():
+        async with machina:
+            responses = await asyncio.gather(*(machina.fetch_policy(policy_identifier=policy_identifier)
+                                               for _ in range(16)))
+            return [await response.json() for response in responses]
+
+    # WHEN many coroutines fetch the same policy at the same time
+    policies = asyncio.run(gather())
+
+    # THEN one request should reach the server, and every caller should receive the policy
+    assert server.requests['GET /policies/{id}'] == 1
+    assert single_flight.stats() == {'requests': 1, 'coalesced': 15}
+    assert all(policy['id'] == policy_identifier for policy in policies)
+
+
+def test_async_switch_authentication(fake_machina):
+    """ Switch between authentication methods on one AsyncMachina instance, offline. """
+    # GIVEN an AsyncMachina instance backed by a fake server
+    server = fake_machina['server']
+    machina = aio.AsyncMachina(instance_id=FAKE_INSTANCE_ID, api_url=server.api_url)
+
+    async def list_policies():
+        async with machina:
+            return await machina.list_policies()
+
+    # WHEN I authenticate with basic, then bearer, then HMAC authentication, listing policies after each switch
+    machina.basic_authentication(username='user', password='password')
+    machina.bearer_authentication(token='token')
+    bearer = asyncio.run(list_policies())
+    machina.hmac_authentication(identity=FAKE_IDENTITY, secret=FAKE_SECRET)
+    hmac = asyncio.run(list_policies())
+
+    # THEN each request should be sent with only the latest method, and the HMAC signature should be accepted
+    assert bearer.request_info.headers['Authorization'] == 'Bearer token'
+    assert hmac.status == 200
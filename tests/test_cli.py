@@ -0,0 +1,52 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Test the machina command-line pipeline. """
+
+import io
+import json
+import subprocess
+import sys
+
+from conftest import FAKE_IDENTITY, FAKE_INSTANCE_ID, FAKE_SECRET
+from management_api_tools import cli
+
+
+def test_cli_pipeline(fake_machina, monkeypatch):
+    """ Run NDJSON operations from stdin and read NDJSON results, offline. """
+    # GIVEN a fake server with existing policies, HMAC credentials in the environment, and a mix of operations
+    server = fake_machina['server']
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=3)
+    fetched, deleted, _ = server.policies[FAKE_INSTANCE_ID]
+    monkeypatch.setenv('MACHINA_IDENTITY', FAKE_IDENTITY)
+    monkeypatch.setenv('MACHINA_SECRET', FAKE_SECRET)
+    operations = [{'op': 'fetch', 'id': fetched},
+                  {'op': 'create', 'policy': {'policyId': 'new', 'enabled': True, 'rules': []}},
+                  {'op': 'delete', 'id': deleted},
+                  {'op': 'metrics', 'metric': 'total-users', 'start': '20210101-00:00', 'end': '20210101-03:00',
+                   'bucket': '1h'}]
+    stdin = io.StringIO('\n'.join(json.dumps(operation) for operation in operations) + '\n\nnot json\n')
+    stdout = io.StringIO()
+
+    # WHEN I run the pipeline
+    status = cli.main(['--instance-id', FAKE_INSTANCE_ID, '--api-url', server.api_url, '--ordered'],
+                      stdin=stdin, stdout=stdout)
+
+    # THEN every result should be written in order, and the invalid line should fail on its own
+    results = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [(result['line'], result['op'], result['ok']) for result in results] == [
+        (1, 'fetch', True), (2, 'create', True), (3, 'delete', True), (4, 'metrics', True), (6, None, False)]
+    assert results[0]['body']['id'] == fetched and results[3]['body']['points']
+    assert deleted not in server.policies[FAKE_INSTANCE_ID]
+    assert status == 1
+
+
+def test_cli_help_is_lazy():
+    """ Import the command-line module without importing requests or the API. """
+    # GIVEN a fresh interpreter
+    script = 'import sys; from management_api_tools import cli; print("requests" in sys.modules)'
+
+    # WHEN I import the command-line module
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+
+    # THEN requests should not have been imported
+    assert output.strip() == 'False'
@@ -0,0 +1,51 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Test the MachinaFleet implementation. """
+
+import pytest
+
+from conftest import AUTHENTICATION, BASIC, BEARER, FAKE_IDENTITY, FAKE_SECRET, HMAC, load_credentials
+from management_api_tools.fleet import MachinaFleet
+from management_api_tools.testing import FakeMachina
+from management_api_tools.utils.adapters import innermost_adapter
+
+CREDENTIALS = {BASIC: ('username', 'password'), BEARER: ('token',), HMAC: ('identity', 'secret')}
+
+
+@pytest.mark.parametrize('section', AUTHENTICATION)
+def test_fleet_list_policies(section):
+    """ List policies across a fleet test. """
+    # GIVEN a fleet containing an authenticated tenant
+    instance_id, *_ = load_credentials('instance_id', section=section).values()
+    credentials = load_credentials(*CREDENTIALS[section], section=section)
+    fleet = MachinaFleet(max_tenants=2, max_requests=4)
+    fleet.add_tenant(instance_id=instance_id, authentication=section, **credentials)
+
+    # WHEN I run an operation across the fleet
+    results = fleet.run(lambda machina: machina.list_policies().status_code)
+    fleet.close()
+
+    # THEN each tenant should report a result
+    assert results[instance_id].response == 200, f'Failed: {results[instance_id].error}'
+
+
+def test_fleet_shared_pool():
+    """ Resize tenant connection pools in a fleet, offline. """
+    # GIVEN a fleet of two tenants on a fake server
+    with FakeMachina(hmac_credentials={FAKE_IDENTITY: FAKE_SECRET}) as server:
+        fleet = MachinaFleet(max_requests=4, api_url=server.api_url)
+        tenants = [fleet.add_tenant(instance_id=instance_id, authentication=HMAC, identity=FAKE_IDENTITY,
+                                    secret=FAKE_SECRET) for instance_id in ('TENANT_A', 'TENANT_B')]
+        pool = fleet.adapter.adapter
+
+        # WHEN each tenant resizes its connection pool, and then lists policies
+        tenants[0].configure_connection_pool(pool_maxsize=32)
+        tenants[1].configure_connection_pool(pool_maxsize=2)
+        results = fleet.run(lambda machina: machina.list_policies().status_code)
+        fleet.close()
+
+    # THEN the fleet's pool should be unchanged and still shared by both tenants
+    assert fleet.adapter.adapter is pool and pool._pool_maxsize == 4
+    assert all(innermost_adapter(tenant.api_session.get_adapter(url=fleet.api_url)).adapter is fleet.adapter
+               for tenant in tenants)
+    assert [result.response for result in results.values()] == [200, 200]
@@ -4,6 +4,10 @@
 
 from datetime import datetime, timezone, timedelta
 
+import pytest
+
+from management_api_tools.utils.buckets import parse_time, to_epoch
+
 
 def test_metrics(Machina):
     """ Query the total users. """
@@ -19,3 +23,122 @@ def test_metrics(Machina):
 
     # THEN the status code should be 200
     assert api_endpoint.status_code == 200, f'Failed: {api_endpoint.json()}'
+
+
+def test_metrics_range(Machina):
+    """ Query the total users over a window split into chunks. """
+    # GIVEN an authenticated Machina instance
+
+    # WHEN I request a multi-day window at an hourly bucket, one day per chunk
+    end = datetime.now(timezone.utc)
+    start = end + timedelta(days=-3)
+    series = Machina.metrics_range(metric='total-users', start=start, end=end, bucket='1h', chunk='1d')
+
+    # THEN the points should be ordered with no duplicate buckets
+    timestamps = [point['timestamp'] for point in series['points']]
+    assert len(timestamps) == len(set(timestamps))
+    assert timestamps == sorted(timestamps, key=lambda timestamp: parse_time(timestamp))
+
+
+def test_metric_series(Machina):
+    """ Query the total users as a columnar series and re-bucket it. """
+    pytest.importorskip('numpy')
+
+    # GIVEN an authenticated Machina instance
+
+    # WHEN I request two days of hourly points as a series
+    end = datetime.now(timezone.utc)
+    start = end + timedelta(days=-2)
+    series = Machina.metric_series(metric='total-users', start=start, end=end, bucket='1h')
+
+    # THEN re-bucketing to days should preserve the total
+    daily = series.rebucket('1d', how='sum')
+    assert len(daily) <= 3
+    assert daily.sum() == pytest.approx(series.sum())
+
+
+def test_cached_metric_series(Machina, tmp_path):
+    """ Query the total users twice through a local metrics store. """
+    pytest.importorskip('numpy')
+    from management_api_tools.store import MetricStore
+
+    # GIVEN an authenticated Machina instance and an empty metrics store
+    store = MetricStore(directory=tmp_path)
+    end = datetime.now(timezone.utc)
+    start = end + timedelta(days=-2)
+
+    # WHEN I request the same window twice
+    first = Machina.cached_metric_series(metric='total-users', start=start, end=end, bucket='1h', store=store)
+    second = Machina.cached_metric_series(metric='total-users', start=start, end=end, bucket='1h', store=store)
+
+    # THEN the store should hold the window, and both reads should agree
+    assert store.coverage(instance_id=Machina.instance_id, metric='total-users', bucket='1h')
+    assert list(second) == list(first)
+
+
+def test_metrics_stream(fake_machina):
+    """ Stream the points of a metrics response, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server
+    Machina = fake_machina['Machina']
+    metric = {'start': '20210101-00:00', 'end': '20210102-00:00', 'bucket': '1h', 'metric': 'total-users'}
+
+    # WHEN I stream the points, keeping only their values
+    points = list(Machina.metrics(stream=True, **metric))
+    values = list(Machina.metrics(stream=True, fields=('value',), **metric))
+
+    # THEN the streamed points should match the buffered response
+    assert points == Machina.metrics(**metric).json()['points']
+    assert values == [{'value': point['value']} for point in points]
+
+
+def test_metric_point_models(fake_machina):
+    """ Stream metric points as compact models, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server
+    Machina = fake_machina['Machina']
+    metric = {'start': '20210101-00:00', 'end': '20210101-12:00', 'bucket': '1h', 'metric': 'total-users'}
+
+    # WHEN I stream the points as models
+    points = list(Machina.metrics(stream=True, models=True, **metric))
+
+    # THEN they should round-trip to the response points, with epoch timestamps
+    assert [point.to_dict() for point in points] == Machina.metrics(**metric).json()['points']
+    assert points[0].timestamp == to_epoch('20210101-00:00')
+    assert len(set(points)) == len(points)
+
+
+def test_query_many(fake_machina):
+    """ Query several metrics at once, requesting each distinct query once, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server, and overlapping queries
+    Machina, server = fake_machina.values()
+    window = {'start': '20210101-00:00', 'end': '20210101-06:00', 'bucket': '1h'}
+    queries = ['total-users', 'total-users', 'requests',
+               {'metric': 'requests', 'bucket': '2h', 'name': 'requests-2h'}]
+
+    # WHEN I query them together
+    table = Machina.query_many(queries, **window)
+
+    # THEN the three distinct queries should be requested once each, and aligned in one table
+    assert server.requests['GET /metrics'] == 3
+    assert sorted(table.columns) == ['requests', 'requests-2h', 'total-users']
+    assert len(table) == 7 and table.timestamps[0] == parse_time(window['start']).timestamp()
+    assert list(table['requests']) == [point['value'] for point in Machina.metrics(metric='requests', **window)
+                                       .json()['points']]
+    with pytest.raises(ValueError):
+        Machina.query_many(['requests', {'metric': 'total-users', 'name': 'requests'}], **window)
+
+
+def test_metrics_range_retries(fake_machina):
+    """ Retry the failed chunks of a metrics range, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server that throttles or fails a third of requests
+    Machina, server = fake_machina.values()
+    metric = {'metric': 'total-users', 'start': '20210101-00:00', 'end': '20210103-00:00', 'bucket': '1h'}
+    expected = Machina.metrics(**metric).json()['points']
+    server.requests.clear()
+    server.throttle_rate, server.error_rate = 0.2, 0.15
+
+    # WHEN I fetch the range in chunks
+    body = Machina.metrics_range(chunk=4, max_workers=4, retries=20, **metric)
+
+    # THEN the failed chunks should be retried to success, and the points should match a single request
+    assert body['points'] == expected
+    assert sum(server.requests.values()) > 12  # 48 hourly buckets in chunks of 4, and some retries.
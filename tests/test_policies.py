@@ -2,7 +2,23 @@
 
 """ Test the DataPolicies implementation. """
 
-from conftest import load_credentials, read_document
+from concurrent.futures import ThreadPoolExecutor
+import json
+import tarfile
+
+import pytest
+
+from conftest import FAKE_INSTANCE_ID, load_credentials, read_document
+from management_api_tools import testing
+from management_api_tools.models import Policy
+from management_api_tools.utils.adapters import AdapterWrapper
+from management_api_tools.utils.cache import CachingAdapter
+from management_api_tools.utils.concurrency import BatchResult
+from management_api_tools.utils.documents import dump_policy, normalize_policy, policy_hash
+from management_api_tools.utils.journal import OperationJournal
+from management_api_tools.utils.reconcile import CREATE, PolicyOperation, plan_policies
+from management_api_tools.utils.scheduler import AdaptiveLimiter
+from management_api_tools.utils.streaming import iter_json_array
 
 
 def test_list_policies(Machina):
@@ -16,6 +32,56 @@ def test_list_policies(Machina):
     assert response.status_code == 200, f'Failed: {response.json()}'
 
 
+def test_iter_policies(machina_resources):
+    """ Iterate over paginated policies test. """
+    # GIVEN an authenticated Machina instance and a policy_identifier
+    Machina, policy_identifier, section = machina_resources.values()
+
+    # WHEN I iterate over every policy, one small page at a time
+    policy_identifiers = [policy['id'] for policy in Machina.iter_policies(page_size=2)]
+
+    # THEN the created policy should be yielded exactly once
+    assert policy_identifiers.count(policy_identifier) == 1
+
+
+def test_iter_policies_skip_ignored(fake_machina, monkeypatch):
+    """ Stop iterating over pages from a server that ignores skip and omits totalResults, offline. """
+    # GIVEN a fake server whose policy list always returns the first page, without totalResults
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=5)
+    policies_endpoint = testing.policies_endpoint
+
+    def first_page(tenant, method, identifier, trailing_slash, query, document):
+        query = {name: value for name, value in query.items() if name != 'skip'}
+        status, body = policies_endpoint(tenant, method, identifier, trailing_slash, query, document)
+        body.pop('totalResults', None)
+        return status, body
+
+    monkeypatch.setattr(testing, 'policies_endpoint', first_page)
+
+    # WHEN I iterate over every policy two at a time
+    policy_identifiers = [policy['id'] for policy in Machina.iter_policies(page_size=2)]
+
+    # THEN the first page should be yielded once, and passing limit should be rejected
+    assert policy_identifiers == sorted(server.policies[FAKE_INSTANCE_ID])[:2]
+    with pytest.raises(ValueError):
+        next(Machina.iter_policies(page_size=2, limit=10))
+
+
+def test_list_policies_stats(Machina):
+    """ Request instrumentation test. """
+    # GIVEN an authenticated Machina instance
+
+    # WHEN I make a request to an API endpoint
+    response = Machina.list_policies()
+
+    # THEN the request should be counted against its endpoint, with its status code and latency
+    endpoint = Machina.stats()['endpoints']['GET /policies']
+    assert endpoint['requests'] == 1
+    assert endpoint['status_codes'] == {response.status_code: 1}
+    assert endpoint['latency']['total']['count'] == 1
+
+
 def test_fetch_policy(machina_resources):
     """ Fetch policy test. """
     # GIVEN an authenticated Machina instance and a policy_identifier
@@ -28,6 +94,107 @@ def test_fetch_policy(machina_resources):
     assert response.status_code == 200, f'Failed: {response.json()["detail"]["message"]}'
 
 
+def test_fetch_policies(machina_resources):
+    """ Fetch multiple policies concurrently test. """
+    # GIVEN an authenticated Machina instance, a policy_identifier, and one that does not exist
+    Machina, policy_identifier, section = machina_resources.values()
+    policy_identifiers = [policy_identifier, 'does-not-exist']
+
+    # WHEN I fetch the policies concurrently, in input order
+    results = list(Machina.fetch_policies(policy_identifiers=policy_identifiers, max_workers=2, ordered=True))
+
+    # THEN the existing policy should be returned, and the missing policy reported without aborting the batch
+    assert [result.item for result in results] == policy_identifiers
+    assert results[0].ok, f'Failed: {results[0].error or results[0].response.json()}'
+    assert not results[1].ok
+
+
+def test_fetch_policies_scheduled(machina_resources):
+    """ Fetch multiple policies through the request scheduler test. """
+    # GIVEN an authenticated Machina instance with the request scheduler enabled, and a policy_identifier
+    Machina, policy_identifier, section = machina_resources.values()
+    scheduler = Machina.enable_scheduler(initial_concurrency=4)
+
+    # WHEN I fetch the same policy many times concurrently
+    results = list(Machina.fetch_policies(policy_identifiers=[policy_identifier] * 20, max_workers=8))
+
+    # THEN every fetch should succeed, retrying through any rate limiting
+    assert all(result.ok for result in results), f'Failed: {scheduler.stats()}'
+    assert scheduler.stats()['requests'] >= 20
+
+
+def test_scheduler_retries_timeouts(fake_machina):
+    """ Retry requests that time out through the request scheduler, offline. """
+    # GIVEN a scheduled Machina instance backed by a fake server whose responses are often slower than the timeout
+    Machina, server = fake_machina.values()
+    scheduler = Machina.enable_scheduler(retries=20, backoff=0.0)
+    server.latency = (0.0, 0.4)
+
+    # WHEN I list policies with a short read timeout
+    response = Machina.api_session.get(url=f'{Machina.instance_url}/policies', timeout=0.2)
+
+    # THEN the timed out attempts should be retried until one succeeds, and lower the concurrency limit
+    assert response.status_code == 200
+    assert scheduler.stats()['retried'] > 0, f'Failed: {scheduler.stats()}'
+    assert scheduler.stats()['concurrency_limit'] < 8
+
+
+def test_adaptive_limiter_pushback_burst():
+    """ Decrease the concurrency limit once for a burst of pushback from one window of requests. """
+    # GIVEN an adaptive limiter with a full window of requests in flight
+    limiter = AdaptiveLimiter(initial=64, maximum=64)
+    window = [limiter.acquire() for _ in range(64)]
+
+    # WHEN every request in the window is pushed back, and then a request sent after the decrease is too
+    for acquired in window:
+        limiter.release(pushback=True, acquired=acquired)
+    after_burst = limiter.limit
+    limiter.release(pushback=True, acquired=limiter.acquire())
+
+    # THEN the burst should halve the limit once, and the later pushback halve it again
+    assert (after_burst, limiter.limit) == (32, 16)
+
+
+def test_fetch_policy_cached(machina_resources):
+    """ Fetch a cached policy test. """
+    # GIVEN an authenticated Machina instance with the response cache enabled, and a policy_identifier
+    Machina, policy_identifier, section = machina_resources.values()
+    cache = Machina.enable_cache(maxsize=8, ttl=60)
+
+    # WHEN I fetch the same policy twice
+    first = Machina.fetch_policy(policy_identifier=policy_identifier)
+    second = Machina.fetch_policy(policy_identifier=policy_identifier)
+
+    # THEN the second response should be served from the cache with an identical body
+    assert second.content == first.content
+    assert cache.stats()['hits'] == 1, f'Failed: {cache.stats()}'
+
+
+def test_cache_replaced_keyed_and_closed(fake_machina, tmp_path):
+    """ Key cached responses by their request headers, replace the cache when re-enabled, and close it, offline. """
+    # GIVEN a Machina instance backed by a fake server, with an on-disk response cache enabled twice
+    Machina, server = fake_machina.values()
+    first_cache = Machina.enable_cache(directory=tmp_path)
+    cache = Machina.enable_cache(directory=tmp_path)
+
+    # WHEN I list policies as two formats, then again as the first
+    url = f'{Machina.instance_url}/policies'
+    for accept in ('application/json', 'text/plain', 'application/json'):
+        Machina.api_session.get(url=url, headers={'Accept': accept})
+    Machina.api_session.close()
+
+    # THEN only the second cache should be in the stack, each format should be cached separately, and both caches
+    # should be closed
+    adapter, caching_adapters = Machina.api_session.get_adapter(url=url), 0
+    while isinstance(adapter, AdapterWrapper):
+        caching_adapters += isinstance(adapter, CachingAdapter)
+        adapter = adapter.adapter
+    assert caching_adapters == 1
+    assert (cache.stats()['misses'], cache.stats()['hits'], first_cache.stats()['misses']) == (2, 1, 0)
+    assert server.requests['GET /policies'] == 2, f'Failed: {server.requests}'
+    assert first_cache._shelf is None and cache._shelf is None
+
+
 def test_create_policy(machina_resources):
     """ Create policy test. """
     # GIVEN a policy_identifier
@@ -69,6 +236,20 @@ def test_create_update_multiple_policies(machina_resources):
     assert response.status_code in (200, 201), f'Failed: {response.json()["detail"]["message"]}'
 
 
+def test_reconcile_unchanged(machina_resources):
+    """ Reconcile an unchanged policy document test. """
+    # GIVEN an authenticated Machina instance and the policy document used to create a policy
+    Machina, policy_identifier, section = machina_resources.values()
+    document_path, *_ = load_credentials('create_policy', section=section).values()
+    policy_document = read_document(document_path=document_path)
+
+    # WHEN I plan the changes required to reach the desired state
+    plan = Machina.plan_policies(policy_document=policy_document)
+
+    # THEN no writes should be required
+    assert not plan, f'Failed: unexpected operations {plan.operations}'
+
+
 def test_delete_policy(machina_resources):
     """ Delete policy test. """
     # GIVEN an authenticated Machina instance
@@ -79,3 +260,350 @@ def test_delete_policy(machina_resources):
 
     # THEN the status code should be 204
     assert response.status_code == 204, f'Failed: {response.json()["detail"]["message"]}'
+
+
+def test_backup_incremental(fake_machina, tmp_path):
+    """ Back up policies twice, then after a deletion, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server with existing policies
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=10)
+
+    # WHEN I back up the policies, back up again, then delete a policy and back up into an archive
+    first = Machina.backup(directory=tmp_path / 'policies')
+    second = Machina.backup(directory=tmp_path / 'policies')
+    Machina.delete_policy(policy_identifier=next(iter(server.policies[FAKE_INSTANCE_ID])))
+    third = Machina.backup(directory=tmp_path / 'policies', archive=tmp_path / 'policies.tar.gz')
+
+    # THEN only changes should be written, and the stale file removed
+    assert (len(first.written), len(second.written), len(second.unchanged)) == (10, 0, 10)
+    assert len(third.removed) == 1
+    assert len(list((tmp_path / 'policies').glob('*.json'))) == 10  # 9 policies and the manifest.
+    with tarfile.open(tmp_path / 'policies.tar.gz') as archive:
+        manifest = json.load(archive.extractfile('manifest.json'))
+    assert len(manifest) == 9
+
+
+def test_backup_stale_file_missing(fake_machina, tmp_path):
+    """ Back up after a deleted policy's file was already removed by hand, offline. """
+    # GIVEN a backup, then a policy deleted and its backup file removed
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=3)
+    Machina.backup(directory=tmp_path / 'policies')
+    identifier = next(iter(server.policies[FAKE_INSTANCE_ID]))
+    policy_id = server.policies[FAKE_INSTANCE_ID][identifier]['policyId']
+    Machina.delete_policy(policy_identifier=identifier)
+    manifest = json.loads((tmp_path / 'policies' / 'manifest.json').read_text())
+    (tmp_path / 'policies' / manifest[policy_id]['filename']).unlink()
+
+    # WHEN I back up twice more
+    first = Machina.backup(directory=tmp_path / 'policies')
+    second = Machina.backup(directory=tmp_path / 'policies')
+
+    # THEN the first should drop the policy from the manifest, and the second should find nothing to do
+    assert first.removed == [policy_id] and not first.failed
+    assert policy_id not in json.loads((tmp_path / 'policies' / 'manifest.json').read_text())
+    assert (second.removed, len(second.unchanged)) == ([], 2)
+
+
+def test_backup_policy_named_manifest(fake_machina, tmp_path):
+    """ Back up and restore a policy whose policyId names the manifest file, offline. """
+    # GIVEN a policy with the policyId 'manifest'
+    Machina, server = fake_machina.values()
+    policy = {'policyId': 'manifest', 'status': 'Published', 'enabled': True, 'rules': []}
+    Machina.create_policy(policy_document=json.dumps(policy))
+
+    # WHEN I back it up twice, delete it, and restore it
+    first = Machina.backup(directory=tmp_path / 'policies')
+    second = Machina.backup(directory=tmp_path / 'policies')
+    Machina.delete_policy(policy_identifier=next(iter(server.policies[FAKE_INSTANCE_ID])))
+    Machina.restore(path=tmp_path / 'policies')
+
+    # THEN the policy and the manifest should have separate files, and the restore should recreate only the policy
+    manifest = json.loads((tmp_path / 'policies' / 'manifest.json').read_text())
+    assert manifest['manifest']['filename'] != 'manifest.json'
+    assert (first.written, second.unchanged) == (['manifest'], ['manifest'])
+    assert [normalize_policy(live) for live in server.policies[FAKE_INSTANCE_ID].values()] == [policy]
+
+
+def test_restore_from_archive(fake_machina, tmp_path):
+    """ Restore changed and deleted policies from an archive, offline. """
+    # GIVEN a backup archive of existing policies, then a policy deleted and another modified
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=10)
+    Machina.backup(directory=tmp_path / 'policies', archive=tmp_path / 'policies.tar.gz')
+    deleted, modified, *_ = server.policies[FAKE_INSTANCE_ID]
+    Machina.delete_policy(policy_identifier=deleted)
+    policy = dict(server.policies[FAKE_INSTANCE_ID][modified], enabled=False)
+    Machina.update_policy(policy_identifier=modified, policy_document=json.dumps(policy))
+
+    # WHEN I restore from the archive, twice
+    first = Machina.restore(path=tmp_path / 'policies.tar.gz')
+    second = Machina.restore(path=tmp_path / 'policies')
+
+    # THEN only the differing policies should be pushed, and the live state should match the backup
+    assert sorted(result.item.action for result in first) == ['create', 'update']
+    assert all(result.ok for result in first)
+    assert second == []
+    assert server.policies[FAKE_INSTANCE_ID][modified]['enabled'] is True
+
+
+def test_undocumented_fields_kept(fake_machina, tmp_path):
+    """ Keep fields beyond the documented ones through reconcile, backup, restore, and models, offline. """
+    # GIVEN a desired policy with a field the live policy lacks
+    Machina, server = fake_machina.values()
+    desired = {'policyId': 'tagged', 'status': 'Published', 'enabled': True, 'rules': [], 'tags': ['finance']}
+    Machina.create_policy(policy_document=json.dumps(dict(desired, tags=None)))
+
+    # WHEN I reconcile to it, back it up, delete it, and restore it
+    reconciled = Machina.reconcile(policy_document=json.dumps([desired]))
+    Machina.backup(directory=tmp_path / 'policies')
+    identifier, live = next(iter(server.policies[FAKE_INSTANCE_ID].items()))
+    Machina.delete_policy(policy_identifier=identifier)
+    restored = Machina.restore(path=tmp_path / 'policies')
+
+    # THEN the field should be sent, restored, and kept by the model, and differ only by id from the live policy
+    assert [result.item.action for result in reconciled + restored] == ['update', 'create']
+    assert normalize_policy(live) == desired
+    assert [normalize_policy(policy) for policy in server.policies[FAKE_INSTANCE_ID].values()] == [desired]
+    model = Policy.from_json(json.dumps(live))
+    assert model['tags'] == ['finance'] and model.to_dict() == live and model.digest == policy_hash(desired)
+
+
+def test_policy_model_identity_and_mutation():
+    """ Compare policy models by id and content, and keep their digest current through in-place changes. """
+    # GIVEN two policies with the same content and different ids, with rules and an extra field
+    document = {'policyId': 'mutable', 'enabled': True, 'rules': [{'ruleId': 'r1', 'effect': 'Deny'}], 'tags': []}
+    first = Policy.from_json(json.dumps(dict(document, id='a' * 24)))
+    second = Policy.from_json(json.dumps(dict(document, id='b' * 24)))
+    digest = first.digest
+
+    # WHEN I change the rules and the extra field of the first in place
+    first.rules[0]['effect'] = 'Permit'
+    changed_rules = first.digest
+    first['tags'].append('finance')
+
+    # THEN the policies should differ by id but share a digest, and each change should produce a new digest
+    assert first != second and len({first, second}) == 2 and digest == second.digest
+    assert changed_rules == policy_hash(dict(document, rules=[{'ruleId': 'r1', 'effect': 'Permit'}]))
+    assert len({digest, changed_rules, first.digest}) == 3
+
+
+def test_policy_model_digest_after_rules_decoded():
+    """ Recompute a policy model's digest after its raw rules are decoded and changed, and hash null rules. """
+    # GIVEN a policy with raw rules and no extra fields, whose digest has been computed, and a policy with null rules
+    document = {'policyId': 'plain', 'enabled': True, 'rules': [{'ruleId': 'r1', 'effect': 'Deny'}]}
+    policy = Policy.from_json(json.dumps(document))
+    digest = policy.digest
+    null_rules = {'policyId': 'plain', 'rules': None}
+
+    # WHEN I change the rules in place
+    policy.rules[0]['effect'] = 'Permit'
+
+    # THEN the digest should follow the change, and the null rules should hash like the dict
+    assert digest != policy.digest == policy_hash(dict(document, rules=[{'ruleId': 'r1', 'effect': 'Permit'}]))
+    assert plan_policies(desired=[policy], live=[Policy.from_json(json.dumps(dict(document, id='a' * 24)))]).updates
+    assert Policy.from_dict(null_rules).digest == policy_hash(null_rules)
+    assert Policy.from_json(json.dumps(null_rules)).to_dict() == null_rules
+
+
+def test_upload_policies_replace(fake_machina):
+    """ Replace policies with a document uploaded in batches, offline. """
+    # GIVEN existing policies, and a document of new policies
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=5, prefix='old')
+    policies = [{'policyId': f'new-{index}', 'status': 'Published', 'enabled': True, 'rules': []}
+                for index in range(25)]
+    policy_document = json.dumps(policies)
+
+    # WHEN I split the document as a dry run, then upload it in batches with replace semantics
+    dry_run = Machina.upload_policies(policy_document=policy_document, merge='replace', batch_size=10, dry_run=True)
+    summary = Machina.upload_policies(policy_document=policy_document, merge='replace', batch_size=10)
+
+    # THEN the batches should be uploaded, and only the policies in the document should remain
+    assert dry_run.batch_sizes == summary.batch_sizes == [10, 10, 5]
+    assert summary.ok and len(summary.resources) == 25 and len(summary.deletions) == 5
+    remaining = sorted(policy['policyId'] for policy in server.policies[FAKE_INSTANCE_ID].values())
+    assert remaining == sorted(policy['policyId'] for policy in policies)
+
+
+def test_upload_policies_non_json_batch(fake_machina, monkeypatch):
+    """ Record a batch whose response body is not JSON as failed, without aborting the upload, offline. """
+    # GIVEN existing policies, a document of new policies, and a proxy that mangles the second batch's response
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=2, prefix='old')
+    policy_document = json.dumps([{'policyId': f'new-{index}', 'status': 'Published', 'enabled': True, 'rules': []}
+                                  for index in range(3)])
+    upload = Machina.create_update_multiple_policies
+
+    def mangled(policy_document, merge):
+        response = upload(policy_document=policy_document, merge=merge)
+        if 'new-1' in policy_document:
+            response._content = b'<html>Bad Gateway</html>'
+        return response
+
+    monkeypatch.setattr(Machina, 'create_update_multiple_policies', mangled)
+
+    # WHEN I upload the document one policy per batch, with replace semantics
+    summary = Machina.upload_policies(policy_document=policy_document, merge='replace', batch_size=1)
+
+    # THEN only the mangled batch should fail, and no policies should be deleted
+    assert [result.ok for result in summary.batches] == [True, False, True]
+    assert isinstance(summary.batches[1].error, ValueError)
+    assert not summary.ok and len(summary.resources) == 2 and summary.deletions == []
+
+
+def test_list_policies_stream(fake_machina):
+    """ Stream a list of policies, keeping only some fields, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server with existing policies
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=50)
+
+    # WHEN I stream the list, with and without a projection
+    policies = list(Machina.list_policies(stream=True, limit=100))
+    projected = list(Machina.list_policies(stream=True, fields=('id', 'policyId'), limit=100))
+
+    # THEN the streamed policies should match the buffered response, and keep only the projected fields
+    assert policies == Machina.list_policies(limit=100).json()['Resources']
+    assert projected == [{'id': policy['id'], 'policyId': policy['policyId']} for policy in policies]
+
+
+def test_iter_json_array_chunking():
+    """ Decode a streamed array however its body is split into chunks, offline. """
+    # GIVEN a body whose items hold escaped strings, numbers, and nesting, split at every offset
+    items = [{'policyId': 'a"b\\cé', 'rules': [{'ruleId': 1.5e3}, []]}, -25, 'x' * 100, None, [[{}]]]
+    body = json.dumps({'totalResults': 5.0, 'Resources': items, 'after': {}}, ensure_ascii=False).encode()
+
+    # WHEN I decode the items from two chunks split at each offset, and from one-byte chunks
+    splits = [list(iter_json_array([body[:offset], body[offset:]], key='Resources')) for offset in range(len(body))]
+    single_bytes = list(iter_json_array([body[offset:offset + 1] for offset in range(len(body))], key='Resources'))
+
+    # THEN every split should decode the same items, and a truncated body should raise
+    assert all(decoded == items for decoded in splits)
+    assert single_bytes == items
+    with pytest.raises(ValueError):
+        list(iter_json_array([body[:len(body) // 2]], key='Resources'))
+
+
+def test_policy_models(fake_machina):
+    """ Stream policies as compact models and plan against them, offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server with existing policies
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=20)
+    policies = Machina.list_policies(limit=100).json()['Resources']
+
+    # WHEN I stream the policies as models, and plan the live policies with one of them changed
+    models = list(Machina.list_policies(stream=True, models=True, limit=100))
+    changed = Policy.from_dict(policies[0])
+    changed.enabled = not changed.enabled
+    plan = plan_policies(desired=[changed] + models[1:], live=models)
+
+    # THEN the models should match the dicts, hash and serialize like them, and plan only the changed policy
+    assert [model.to_dict() for model in models] == [dict(normalize_policy(policy), id=policy['id'])
+                                                     for policy in policies]
+    assert all(model.digest == policy_hash(policy) and model == Policy.from_dict(policy)
+               for model, policy in zip(models, policies))
+    assert json.loads(Policy.from_json(json.dumps(policies[0])).to_json()) == normalize_policy(policies[0])
+    assert changed.to_json() != dump_policy(policies[0])
+    assert [operation.policy_id for operation in plan.updates] == [policies[0]['policyId']]
+    assert len(plan.unchanged) == 19
+
+
+def test_fetch_policy_coalesced(fake_machina):
+    """ Share one request among identical concurrent fetches, offline. """
+    # GIVEN a slow fake server with an existing policy, and coalescing enabled
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=1)
+    server.latency = 0.2
+    policy_identifier = next(iter(server.policies[FAKE_INSTANCE_ID]))
+    single_flight = Machina.enable_coalescing()
+    Machina.configure_connection_pool(pool_maxsize=16)
+
+    # WHEN many threads fetch the same policy at the same time
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(lambda _: Machina.fetch_policy(policy_identifier=policy_identifier), range(16)))
+
+    # THEN one request should reach the server, and every caller should receive the policy
+    assert server.requests['GET /policies/{id}'] == 1
+    assert single_flight.stats() == {'requests': 1, 'coalesced': 15}
+    assert all(response.json()['id'] == policy_identifier for response in responses)
+
+
+def test_resume_journaled(fake_machina, tmp_path):
+    """ Resume an interrupted journaled job, applying only the unfinished operations, offline. """
+    # GIVEN a journal of planned creates, of which the first 20 were applied before the process died mid-write
+    Machina, server = fake_machina.values()
+    operations = [PolicyOperation(action=CREATE, policy_id=f'p-{index}',
+                                  policy_document=json.dumps({'policyId': f'p-{index}', 'rules': []}))
+                  for index in range(30)]
+    with OperationJournal(path=tmp_path / 'job.journal') as journal:
+        journal.plan(operations=operations)
+        for seq, operation in journal.pending()[:20]:
+            journal.record(seq=seq, result=BatchResult(item=operation, response=Machina.apply_operation(operation)),
+                           finished=True)
+    with open(tmp_path / 'job.journal', 'a') as file:
+        file.write('{"seq":20,"fini')
+
+    # WHEN I resume the job, reporting progress, and then resume it again
+    reports = []
+    resumed = Machina.resume_journaled(journal=tmp_path / 'job.journal', progress=reports.append)
+    again = Machina.resume_journaled(journal=tmp_path / 'job.journal')
+
+    # THEN only the remaining 10 operations should be applied, once
+    assert sorted(result.item.policy_id for result in resumed) == [f'p-{index}' for index in range(20, 30)]
+    assert all(result.ok for result in resumed) and again == []
+    assert len(server.policies[FAKE_INSTANCE_ID]) == 30
+    assert (reports[-1].total, reports[-1].skipped, reports[-1].finished, reports[-1].remaining) == (30, 20, 10, 0)
+
+
+def test_resume_journaled_lost_outcomes(fake_machina, tmp_path):
+    """ Resume a journaled job whose outcomes of successful creates were lost, offline. """
+    # GIVEN a journal of planned creates, of which the first 5 were applied but their outcomes never reached disk
+    Machina, server = fake_machina.values()
+    operations = [PolicyOperation(action=CREATE, policy_id=f'p-{index}',
+                                  policy_document=json.dumps({'policyId': f'p-{index}', 'rules': []}))
+                  for index in range(10)]
+    with OperationJournal(path=tmp_path / 'job.journal') as journal:
+        journal.plan(operations=operations)
+    for operation in operations[:5]:
+        Machina.apply_operation(operation)
+
+    # WHEN I resume the job
+    resumed = Machina.resume_journaled(journal=tmp_path / 'job.journal')
+
+    # THEN only the creates of missing policies should be sent, and none should be duplicated
+    assert sorted(result.item.policy_id for result in resumed) == [f'p-{index}' for index in range(5, 10)]
+    policy_ids = [policy['policyId'] for policy in server.policies[FAKE_INSTANCE_ID].values()]
+    assert sorted(policy_ids) == sorted(operation.policy_id for operation in operations)
+    assert OperationJournal(path=tmp_path / 'job.journal').pending() == []
+
+
+def test_watch(fake_machina):
+    """ Watch policies and fan the changes out to several subscribers, offline. """
+    # GIVEN existing policies, and a watcher with two subscribers
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=5)
+    modified, removed, *_ = server.policies[FAKE_INSTANCE_ID]
+    watcher = Machina.watch(min_interval=0.05, max_interval=0.2, page_size=2)
+    subscriptions = [watcher.subscribe(), watcher.subscribe()]
+
+    # WHEN a policy is added, one modified, and one deleted
+    Machina.create_policy(policy_document=json.dumps({'policyId': 'added', 'enabled': True, 'rules': []}))
+    policy = dict(server.policies[FAKE_INSTANCE_ID][modified], enabled=False)
+    Machina.update_policy(policy_identifier=modified, policy_document=json.dumps(policy))
+    Machina.delete_policy(policy_identifier=removed)
+    seen = [[], []]
+    for changes, subscription in zip(seen, subscriptions):
+        while len(changes) < 3:
+            change = subscription.get(timeout=5)
+            assert change is not None, f'Missing changes, got {changes}'
+            changes.append(change)
+    watcher.stop()
+    quiet = watcher.poll()
+
+    # THEN each subscriber should receive the same three deltas, and a quiet poll should be answered with 304s
+    kinds = {change.kind: change for change in seen[0]}
+    assert seen[0] == seen[1] and sorted(kinds) == ['added', 'modified', 'removed']
+    assert kinds['added'].policy_id == 'added' and kinds['modified'].policy['enabled'] is False
+    assert kinds['removed'].policy_identifier == removed and kinds['removed'].policy is None
+    assert list(subscriptions[0]) == []
+    assert quiet == [] and Machina.stats()['endpoints']['GET /policies']['status_codes'][304] >= 3
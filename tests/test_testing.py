@@ -0,0 +1,86 @@
+# © 2021 Ionic Security Inc. By using this code, I agree to the Terms & Conditions (https://dev.ionic.com/use).
+
+""" Test the Machina implementation against the local FakeMachina server. """
+
+import json
+
+from conftest import FAKE_INSTANCE_ID
+
+POLICY = {'status': 'Published', 'enabled': True, 'policyId': 'fake policy', 'description': 'A fake policy.',
+          'ruleCombiningAlgId': 'deny-overrides', 'rules': [{'ruleId': 'fa4e', 'effect': 'Permit'}]}
+
+
+def test_fake_policy_lifecycle(fake_machina):
+    """ Create, fetch, update, list, and delete a policy offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server
+    Machina, server = fake_machina.values()
+
+    # WHEN I create, update, and delete a policy
+    created = Machina.create_policy(policy_document=json.dumps(POLICY))
+    policy_identifier = created.json()['id']
+    updated = Machina.update_policy(policy_identifier=policy_identifier,
+                                    policy_document=json.dumps(dict(POLICY, enabled=False)))
+    fetched = Machina.fetch_policy(policy_identifier=policy_identifier)
+    listed = Machina.list_policies()
+    deleted = Machina.delete_policy(policy_identifier=policy_identifier)
+
+    # THEN each request should succeed against the signed, in-memory API
+    assert (created.status_code, updated.status_code, deleted.status_code) == (201, 200, 204)
+    assert fetched.json()['enabled'] is False
+    assert listed.json()['totalResults'] == 1
+    assert not server.policies[FAKE_INSTANCE_ID]
+
+
+def test_fake_replace_multiple_policies(fake_machina):
+    """ Replace all policies with a document offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server with existing policies
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=5)
+
+    # WHEN I replace the policies with a document containing a single policy
+    response = Machina.create_update_multiple_policies(policy_document=json.dumps([POLICY]), merge='replace')
+
+    # THEN only that policy should remain
+    assert response.status_code in (200, 201)
+    assert [policy['policyId'] for policy in server.policies[FAKE_INSTANCE_ID].values()] == [POLICY['policyId']]
+
+
+def test_fake_metrics(fake_machina):
+    """ Query metrics offline. """
+    # GIVEN an authenticated Machina instance backed by a fake server
+    Machina, server = fake_machina.values()
+
+    # WHEN I request one day of hourly points
+    response = Machina.metrics(metric='total-users', start='20210101-00:00', end='20210102-00:00', bucket='1h')
+
+    # THEN every bucket should be returned, including the end
+    assert len(response.json()['points']) == 25
+
+
+def test_fake_rejects_bad_signature(fake_machina):
+    """ Reject an HMAC signature made with the wrong secret. """
+    # GIVEN a Machina instance signing with the wrong secret
+    Machina, server = fake_machina.values()
+    Machina.hmac_authentication(identity='fake-identity', secret='d3Jvbmc=')
+
+    # WHEN I make a request to an API endpoint
+    response = Machina.list_policies()
+
+    # THEN the request should be rejected
+    assert response.status_code == 401
+
+
+def test_fake_throttling_with_scheduler(fake_machina):
+    """ Retry injected 429 responses with the request scheduler. """
+    # GIVEN a fake server that throttles half of all requests, and a Machina instance with the scheduler enabled
+    Machina, server = fake_machina.values()
+    server.add_policies(instance_id=FAKE_INSTANCE_ID, count=20)
+    server.throttle_rate = 0.5
+    scheduler = Machina.enable_scheduler(retries=20, backoff=0.001)
+
+    # WHEN I fetch every policy concurrently
+    results = list(Machina.fetch_policies(policy_identifiers=list(server.policies[FAKE_INSTANCE_ID]), max_workers=8))
+
+    # THEN every fetch should eventually succeed
+    assert all(result.ok for result in results)
+    assert scheduler.stats()['pushbacks'] > 0